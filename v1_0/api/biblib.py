@@ -0,0 +1,111 @@
+import uuid
+import warnings
+import pytest
+from contextlib import contextmanager
+from ..user_roles import anonymous_user, authenticated_user
+from .. import config
+from .. import schema
+from ..schema import Contains, Equal, List, Predicate, keys
+
+bibcodes = ['1993CoPhC..74..239H', '1994GPC.....9...69H', '2012ASPC..461..763H']
+
+library_schema = schema.compile(Contains({
+    'documents': List(Predicate(lambda value: isinstance(value, type(u'')), 'a bibcode')),
+    'metadata': Contains(keys([u'id', u'name', u'description', u'public', u'num_documents',
+                               u'date_created', u'date_last_modified'])),
+}))
+
+
+def library_name(prefix='adsrex'):
+    # names have to be unique for a user; this one can be found again when
+    # a run died before its cleanup
+    return '%s-%s' % (prefix, uuid.uuid4().hex[0:12])
+
+
+@contextmanager
+def temporary_library(user, bibcodes=(), name=None, public=False):
+    # creates a library and yields its id; the library is deleted again
+    # whatever happens inside the block, a failed delete is only a warning
+    # so that it doesn't hide what went wrong in there
+    r = user.post('/biblib/libraries', json={'name': name or library_name(),
+                                             'description': 'created by adsrex, safe to delete',
+                                             'public': public, 'bibcode': list(bibcodes)})
+    assert r.status_code == 200, r.text[0:200]
+    library = r.json()['id']
+    try:
+        yield library
+    finally:
+        try:
+            r = user.delete('/biblib/documents/%s' % library)
+            error = None if r.status_code == 200 else r.text[0:200]
+        except Exception as e:
+            error = repr(e)
+        if error is not None:
+            warnings.warn('library %s was not deleted: %s' % (library, error))
+
+
+def read_library(user, library, rows=None):
+    # every bibcode of a library, paging with start/rows
+    rows = rows or config.BIBLIB_PAGE_ROWS
+    documents = []
+    while True:
+        r = user.get('/biblib/libraries/%s' % library, params={'start': len(documents), 'rows': rows})
+        assert r.status_code == 200, r.text[0:200]
+        library_schema.validate(r.json())
+        page = r.json()['documents']
+        documents.extend(page)
+        if len(page) < rows or len(documents) >= r.json()['metadata']['num_documents']:
+            return documents
+
+
+def change_documents(user, library, action, bibcodes):
+    r = user.post('/biblib/documents/%s' % library, json={'bibcode': list(bibcodes), 'action': action})
+    assert r.status_code == 200, r.text[0:200]
+    return r.json()['number_added' if action == 'add' else 'number_removed']
+
+
+# the library names are new on every run, a cassette can't replay them
+not_on_replay = pytest.mark.skipif(config.CASSETTE_MODE == 'replay',
+                                   reason='library names differ from the recording')
+
+
+@not_on_replay
+def test_anonymous_user():
+    r = anonymous_user.get('/biblib/libraries')
+    assert r.status_code == 401
+    r = anonymous_user.post('/biblib/libraries', json={'name': library_name()})
+    assert r.status_code == 401
+
+
+@not_on_replay
+def test_authenticated_user(user=authenticated_user):
+    with temporary_library(user, bibcodes[0:1]) as library:
+        r = user.get('/biblib/libraries')
+        assert r.status_code == 200
+        assert library in [l['id'] for l in r.json()['libraries']]
+
+        # bibcodes that are already in the library are not added twice
+        assert change_documents(user, library, 'add', bibcodes) == len(bibcodes) - 1
+        assert sorted(read_library(user, library, rows=2)) == sorted(bibcodes)
+        assert change_documents(user, library, 'remove', bibcodes[0:1]) == 1
+        assert sorted(read_library(user, library)) == sorted(bibcodes[1:])
+
+        r = user.put('/biblib/documents/%s' % library, json={'public': True})
+        assert r.status_code == 200
+        r = user.get('/biblib/libraries/%s' % library, params={'rows': 1})
+        schema.compile(Contains({'metadata': Contains({'public': Equal(True)})})).validate(r.json())
+
+        # other users need an account, so this is only tried with one
+        if config.BIBLIB_COLLABORATOR:
+            r = user.post('/biblib/permissions/%s' % library,
+                          json={'email': config.BIBLIB_COLLABORATOR, 'permission': {'read': True}})
+            assert r.status_code == 200, r.text[0:200]
+            r = user.get('/biblib/permissions/%s' % library)
+            assert r.status_code == 200
+            assert {config.BIBLIB_COLLABORATOR: ['read']} in r.json()
+            r = user.post('/biblib/permissions/%s' % library,
+                          json={'email': config.BIBLIB_COLLABORATOR, 'permission': {'read': False}})
+            assert r.status_code == 200, r.text[0:200]
+
+    r = user.get('/biblib/libraries/%s' % library)
+    assert r.status_code == 404
@@ -1,5 +1,7 @@
-from ..user_roles import anonymous_user, authenticated_user, bumblebee_user
+from ..user_roles import anonymous_user, authenticated_user, bumblebee_user, token_shared
+from .. import config
 import time
+import pytest
 
 def test_resources():
     
@@ -143,7 +145,13 @@ def test_resources():
         ]:
         assert endpoint in resources['adsws.feedback']['endpoints']
 
+# counts on nothing else spending the token's budget in between; in parallel
+# runs that takes a token per worker (AUTHENTICATED_USER_ACCESS_TOKENS)
+@pytest.mark.skipif(config.CASSETTE_MODE == 'replay',
+                    reason='replayed responses carry the budget of the recording')
 def test_limits():
+    if token_shared():
+        pytest.skip('other xdist workers spend the budget of this token')
     # Check the response contains Headers
     # and the limits are there
     r = authenticated_user.get('/search/query', params={'q': 'title:"%s"' % time.time()})
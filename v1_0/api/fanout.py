@@ -0,0 +1,24 @@
+from ..async_roles import async_authenticated_user, async_bumblebee_user, gather
+
+# bibcodes used elsewhere in the suite
+bibcodes = ['1995ApJ...447L..37W', '2010MNRAS.409.1719J', '1993CoPhC..74..239H',
+            '1994GPC.....9...69H', '1980ApJS...44..169S', '1980ApJS...44..193S',
+            '2012ASPC..461..763H']
+
+def check_fanout(user):
+    # graphics, recommendations and metrics for all bibcodes at once
+    pending = []
+    for bibcode in bibcodes:
+        for endpoint in ['/graphics/%s', '/recommender/%s', '/metrics/%s']:
+            pending.append(user.get(endpoint % bibcode))
+    responses = gather(pending, timeout=300)
+    assert len(responses) == 3 * len(bibcodes)
+    for r in responses:
+        assert r.status_code == 200
+        assert isinstance(r.json(), dict)
+
+def test_authenticated_user():
+    check_fanout(async_authenticated_user)
+
+def test_bumblebee_user():
+    check_fanout(async_bumblebee_user)
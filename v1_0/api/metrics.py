@@ -1,8 +1,54 @@
-from ..user_roles import anonymous_user, authenticated_user, bumblebee_user
+from ..user_roles import anonymous_user, authenticated_user
+from .. import matrix
+from .. import schema
+from ..schema import Equal, keys
 from unittest import TestCase
     
 bibcodes = ['1993CoPhC..74..239H','1994GPC.....9...69H']
 
+indicators = [u'g', u'read10', u'm', u'i10', u'riq', u'h', u'i100', u'tori']
+basic_stats = [u'median number of downloads', u'average number of reads',
+               u'normalized paper count', u'recent number of reads', u'number of papers',
+               u'recent number of downloads', u'total number of reads',
+               u'median number of reads', u'total number of downloads',
+               u'average number of downloads']
+citation_stats = [u'normalized number of citations', u'average number of refereed citations',
+                  u'median number of citations', u'median number of refereed citations',
+                  u'number of citing papers', u'average number of citations',
+                  u'total number of refereed citations',
+                  u'normalized number of refereed citations',
+                  u'number of self-citations', u'total number of citations']
+# All histograms with their constituents, which are dictionaries
+histdict = {
+    'downloads': [u'refereed downloads', u'all downloads normalized',
+                  u'all downloads', u'refereed downloads normalized'],
+    'reads': [u'refereed reads', u'all reads normalized', 
+              u'all reads', u'refereed reads normalized'],
+    'publications': [u'refereed publications', u'all publications',
+                     u'refereed publications normalized',
+                     u'all publications normalized'],
+    'citations': [u'refereed to nonrefereed', u'nonrefereed to nonrefereed',
+                  u'nonrefereed to nonrefereed normalized', u'nonrefereed to refereed',
+                  u'refereed to refereed normalized', u'refereed to nonrefereed normalized',
+                  u'refereed to refereed', u'nonrefereed to refereed normalized']
+           }
+
+def metrics_shape(skipped=()):
+    return {
+        'basic stats': keys(basic_stats),
+        'basic stats refereed': keys(basic_stats),
+        'citation stats': keys(citation_stats),
+        'citation stats refereed': keys(citation_stats),
+        'indicators': keys(indicators),
+        'indicators refereed': keys(indicators),
+        'histograms': dict((hist, keys(histdict[hist], dict)) for hist in histdict),
+        'time series': keys([u'g', u'h', u'tori', u'i10', u'read10', u'i100']),
+        # There should be no skipped bibcodes
+        'skipped bibcodes': Equal(list(skipped)),
+    }
+
+metrics_schema = schema.compile(metrics_shape())
+
 class MetricsServiceTest(TestCase):    
     def test_anonymous_user(self):
         # Request all metrics for two existing bibcodes
@@ -10,75 +56,14 @@ class MetricsServiceTest(TestCase):
         # We should get a 401 status
         self.assertEqual(r.status_code, 401)
         
-    def test_authenticated_user(self, user=authenticated_user):
+    def check_metrics(self, user=authenticated_user):
         # Request all metrics for two existing bibcodes
         r = user.post('/metrics', json={'bibcodes': bibcodes})
         # We should get a 200 status
         self.assertEqual(r.status_code, 200)
-        # The results should be in a dictionary
-        self.assertIsInstance(r.json(), dict)
-        # Check if we get the expected attributes
-        expected_attr = [u'basic stats', u'citation stats refereed',
-                         u'histograms', u'citation stats', u'time series',
-                         u'basic stats refereed', u'indicators refereed',
-                         u'skipped bibcodes', u'indicators']
-        self.assertItemsEqual(r.json().keys(), expected_attr)
-        # Check if we retrieved all histograms
-        expected_hists = [u'downloads', u'citations', u'reads', u'publications']
-        self.assertListEqual(r.json()['histograms'].keys(), expected_hists)
-        # All histograms should have the expected constituents
-        histdict = {
-            'downloads': [u'refereed downloads', u'all downloads normalized',
-                          u'all downloads', u'refereed downloads normalized'],
-            'reads': [u'refereed reads', u'all reads normalized', 
-                      u'all reads', u'refereed reads normalized'],
-            'publications': [u'refereed publications', u'all publications',
-                             u'refereed publications normalized',
-                             u'all publications normalized'],
-            'citations': [u'refereed to nonrefereed', u'nonrefereed to nonrefereed',
-                          u'nonrefereed to nonrefereed normalized', u'nonrefereed to refereed',
-                          u'refereed to refereed normalized', u'refereed to nonrefereed normalized',
-                          u'refereed to refereed', u'nonrefereed to refereed normalized']
-                   }
-        for hist in expected_hists:
-            self.assertItemsEqual(r.json()['histograms'][hist].keys(), histdict[hist])
-        # All histogram constituents should be dictionaries
-        for hist in expected_hists:
-            for hh in histdict[hist]:
-                self.assertIsInstance(r.json()['histograms'][hist][hh], dict)
-        # Did we get all expected indicators?
-        expected_stats = {
-            'indicators': [u'g', u'read10', u'm', u'i10', u'riq', u'h', u'i100', u'tori'],
-            'indicators refereed': [u'g', u'read10', u'm', u'i10', u'riq', u'h', u'i100', u'tori'],
-            'basic stats': [u'median number of downloads', u'average number of reads',
-                            u'normalized paper count', u'recent number of reads', u'number of papers',
-                            u'recent number of downloads', u'total number of reads',
-                            u'median number of reads', u'total number of downloads',
-                            u'average number of downloads'],
-            'basic stats refereed': [u'median number of downloads', u'average number of reads',
-                            u'normalized paper count', u'recent number of reads', u'number of papers',
-                            u'recent number of downloads', u'total number of reads',
-                            u'median number of reads', u'total number of downloads',
-                            u'average number of downloads'],
-            'citation stats': [u'normalized number of citations', u'average number of refereed citations',
-                               u'median number of citations', u'median number of refereed citations',
-                               u'number of citing papers', u'average number of citations',
-                               u'total number of refereed citations',
-                               u'normalized number of refereed citations',
-                               u'number of self-citations', u'total number of citations'],
-            'citation stats refereed': [u'normalized number of citations',
-                               u'average number of refereed citations',
-                               u'median number of citations', u'median number of refereed citations',
-                               u'number of citing papers', u'average number of citations',
-                               u'total number of refereed citations',
-                               u'normalized number of refereed citations',
-                               u'number of self-citations', u'total number of citations'],
-            'time series': [u'g', u'h', u'tori', u'i10', u'read10', u'i100']        
-        }
-        for entry in expected_stats:
-            self.assertItemsEqual(r.json()[entry].keys(), expected_stats[entry])
-        # There should be no skipped bibcodes
-        self.assertListEqual(r.json()['skipped bibcodes'], [])
+        # The results should be a dictionary with all expected attributes,
+        # histograms and statistics (see metrics_schema)
+        metrics_schema.validate(r.json())
         # Sending an empty list of bibcodes to the service should give a 403
         r = user.post('/metrics', json={'bibcodes': []})
         self.assertEqual(r.status_code, 403)
@@ -90,6 +75,6 @@ class MetricsServiceTest(TestCase):
         r = user.post('/metrics', json={'bibcodes': bibcodes[:1]})
         # We should get a 200 status
         self.assertEqual(r.status_code, 200)
-    
-    def test_bumblebee_user(self):
-        self.test_authenticated_user(user=bumblebee_user)
+
+
+test_roles = matrix.roles_test('metrics', MetricsServiceTest, 'check_metrics')
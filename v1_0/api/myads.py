@@ -12,6 +12,16 @@ def test_anonymous_user():
     assert r.status_code == 401
 
 def test_authenticated_user():
+    check_vault()
+
+
+def check_vault_concurrently():
+    # the load and soak runs: their iterations write the user data of one
+    # token at the same time, so only the statuses are checked
+    check_vault(read_back=False)
+
+
+def check_vault(read_back=True):
     # bumblebee config
     r = authenticated_user.get('/vault/configuration')
     assert r.status_code == 200
@@ -25,12 +35,14 @@ def test_authenticated_user():
     # server side user storage
     r = authenticated_user.post('/vault/user-data', json={'link_server': 'foo'})
     assert r.status_code == 200
-    assert r.json()['link_server'] == 'foo'
+    if read_back:
+        assert r.json()['link_server'] == 'foo'
     
     r = authenticated_user.get('/vault/user-data')
     assert r.status_code == 200
     assert isinstance(r.json(), dict)
-    assert r.json()['link_server'] == 'foo'
+    if read_back:
+        assert r.json()['link_server'] == 'foo'
     
     
     # i'm using my own access token, once we switch to a dedicated account
@@ -1,6 +1,11 @@
 from ..user_roles import anonymous_user, authenticated_user, bumblebee_user
-import requests
+from ..token_store import TokenStore
+from ..orcid_index import ProfileIndex
+from .. import cassette
+from .. import config
 import copy
+import json
+import time
 
 def test_access():
     for x in ['/orcid/exchangeOAuthCode', 
@@ -8,7 +13,7 @@ def test_access():
         r = anonymous_user.get(x)
         assert r.status_code == 401 # right now it throws 500 (probably error with orcid service)
 
-def test_orcid_workflow():
+def exchange_code():
     # getting the 'exchange token' involves logging into orcid
     # and getting the code from the url redirect; but it seems
     # that ORCID allows us to get the code from the endpoint; 
@@ -48,7 +53,7 @@ def test_orcid_workflow():
             "approved":True,"persistentTokenEnabled":False}
     
     
-    r = requests.post(authenticated_user.get_config('ORCID_OAUTH_ENDPOINT'), json=data)
+    r = anonymous_user.post(authenticated_user.get_config('ORCID_OAUTH_ENDPOINT'), json=data)
     redirect = r.json()['redirectUri']['value']
     exchange_code = redirect.split('code=')[1].split('#')[0]
     
@@ -60,179 +65,212 @@ def test_orcid_workflow():
     assert r.status_code == 200
 
     # these are the important keys that our own API needs    
-    access_token = r.json()['access_token']
-    orcid = r.json()['orcid']
-    
-    
-    r = bumblebee_user.get('/orcid/%s/orcid-profile' % orcid, headers={'Orcid-Authorization': 'Bearer %s' % access_token})
+    data = {'access_token': r.json()['access_token'], 'orcid': r.json()['orcid']}
+    expires_in = r.json().get('expires_in') or config.ORCID_TOKEN_TTL
+    return json.dumps(data), time.time() + min(expires_in, config.ORCID_TOKEN_TTL)
+
+
+_token_store = []
+
+def token_store():
+    # the exchanged token is kept next to the bootstrap tokens (or in the
+    # cassette), so that only the first of many runs logs into orcid
+    if not _token_store:
+        if config.CASSETTE_MODE:
+            _token_store.append(cassette.CassetteTokenStore(cassette.load(config.CASSETTE),
+                                                            config.CASSETTE_MODE))
+        elif config.ORCID_TOKEN_CACHE:
+            _token_store.append(TokenStore(config.ORCID_TOKEN_CACHE,
+                                           margin=config.BOOTSTRAP_TOKEN_MARGIN))
+        else:
+            _token_store.append(None)
+    return _token_store[0]
+
+
+def orcid_access(refresh=False):
+    # {'access_token': ..., 'orcid': ...} for the ORCID_USER; refresh drops
+    # a cached pair that orcid doesn't accept anymore
+    store = token_store()
+    if store is None:
+        return json.loads(exchange_code()[0])
+    key = 'orcid %s %s %s' % (authenticated_user.get_config('ORCID_OAUTH_ENDPOINT'),
+                              authenticated_user.get_config('ORCID_USER'), bumblebee_user.api_url)
+    if refresh and hasattr(store, 'invalidate'):
+        store.invalidate(key)
+    return json.loads(store.get(key, exchange_code))
+
+
+def orcid_headers(access):
+    return {'Orcid-Authorization': 'Bearer %s' % access['access_token']}
+
+
+def works_payload(works):
+    return {'message-version': '1.2',
+            'orcid-profile': {'orcid-activities': {'orcid-works': {'orcid-work': works}}}}
+
+
+sample_work = {
+      "language-code": None, 
+      "source": {
+       "source-orcid": None, 
+       "source-name": {
+        "value": "NASA ADS"
+       }, 
+       "source-date": {
+        "value": 1437165488504
+       }, 
+       "source-client-id": {
+        "path": authenticated_user.get_config('ORCID_CLIENT_ID'), 
+        "host": "sandbox.orcid.org", 
+        "uri": "http://sandbox.orcid.org/client/APP-P5ANJTQRRTMA6GXZ", 
+        "value": None
+       }
+      }, 
+      "work-title": {
+       "translated-title": None, 
+       "subtitle": None, 
+       "title": {
+        "value": "Monte Carlo studies of medium-size telescope designs for the Cherenkov Telescope Array"
+       }
+      }, 
+      "created-date": {
+       "value": 1437165488504
+      }, 
+      "work-citation": None, 
+      "work-type": "JOURNAL_ARTICLE", 
+      "publication-date": {
+       "month": {
+        "value": "01"
+       }, 
+       "day": None, 
+       "media-type": None, 
+       "year": {
+        "value": "2016"
+       }
+      }, 
+      "visibility": "PUBLIC", 
+      "journal-title": None, 
+      "work-external-identifiers": {
+       "scope": None, 
+       "work-external-identifier": [
+        {
+         "work-external-identifier-id": {
+          "value": "2016APh....72...11W"
+         }, 
+         "work-external-identifier-type": "BIBCODE"
+        }, 
+        {
+         "work-external-identifier-id": {
+          "value": "11002538"
+         }, 
+         "work-external-identifier-type": "OTHER_ID"
+        }, 
+        {
+         "work-external-identifier-id": {
+          "value": "10.1016/j.astropartphys.2015.04.008"
+         }, 
+         "work-external-identifier-type": "DOI"
+        }
+       ]
+      }, 
+      "url": {
+       "value": "https://ui.adsabs.harvard.edu/#abs/2016APh....72...11W"
+      }, 
+      "short-description": "We present studies for optimizing the next generation of ground-based imaging atmospheric Cherenkov telescopes (IACTs).", 
+      "work-contributors": {
+       "contributor": [
+        {
+         "contributor-orcid": None, 
+         "contributor-attributes": {
+          "contributor-role": "AUTHOR", 
+          "contributor-sequence": None
+         }, 
+         "credit-name": {
+          "visibility": "PUBLIC", 
+          "value": "Wood, M."
+         }, 
+         "contributor-email": None
+        }, 
+        {
+         "contributor-orcid": None, 
+         "contributor-attributes": {
+          "contributor-role": "AUTHOR", 
+          "contributor-sequence": None
+         }, 
+         "credit-name": {
+          "visibility": "PUBLIC", 
+          "value": "Jogler, T."
+         }, 
+         "contributor-email": None
+        }, 
+        {
+         "contributor-orcid": None, 
+         "contributor-attributes": {
+          "contributor-role": "AUTHOR", 
+          "contributor-sequence": None
+         }, 
+         "credit-name": {
+          "visibility": "PUBLIC", 
+          "value": "Dumm, J."
+         }, 
+         "contributor-email": None
+        }, 
+        {
+         "contributor-orcid": None, 
+         "contributor-attributes": {
+          "contributor-role": "AUTHOR", 
+          "contributor-sequence": None
+         }, 
+         "credit-name": {
+          "visibility": "PUBLIC", 
+          "value": "Funk, S."
+         }, 
+         "contributor-email": None
+        }
+       ]
+      }, 
+      "work-source": None
+     }
+
+
+def test_orcid_workflow():
+    access = orcid_access()
+    orcid = access['orcid']
+    r = bumblebee_user.get('/orcid/%s/orcid-profile' % orcid, headers=orcid_headers(access))
+    if r.status_code == 401:
+        # the cached token was revoked or has expired early
+        access = orcid_access(refresh=True)
+        r = bumblebee_user.get('/orcid/%s/orcid-profile' % orcid, headers=orcid_headers(access))
     assert 'orcid-profile' in r.json()
     assert r.status_code == 200
     
-    data = r.json()
-    new_data = {'message-version': '1.2',
-                'orcid-profile': {
-                      'orcid-activities': {
-                         'orcid-works': {
-                            'orcid-work': [
-                               {
-                                 "language-code": None, 
-                                 "source": {
-                                  "source-orcid": None, 
-                                  "source-name": {
-                                   "value": "NASA ADS"
-                                  }, 
-                                  "source-date": {
-                                   "value": 1437165488504
-                                  }, 
-                                  "source-client-id": {
-                                   "path": authenticated_user.get_config('ORCID_CLIENT_ID'), 
-                                   "host": "sandbox.orcid.org", 
-                                   "uri": "http://sandbox.orcid.org/client/APP-P5ANJTQRRTMA6GXZ", 
-                                   "value": None
-                                  }
-                                 }, 
-                                 "work-title": {
-                                  "translated-title": None, 
-                                  "subtitle": None, 
-                                  "title": {
-                                   "value": "Monte Carlo studies of medium-size telescope designs for the Cherenkov Telescope Array"
-                                  }
-                                 }, 
-                                 "created-date": {
-                                  "value": 1437165488504
-                                 }, 
-                                 "work-citation": None, 
-                                 "work-type": "JOURNAL_ARTICLE", 
-                                 "publication-date": {
-                                  "month": {
-                                   "value": "01"
-                                  }, 
-                                  "day": None, 
-                                  "media-type": None, 
-                                  "year": {
-                                   "value": "2016"
-                                  }
-                                 }, 
-                                 "visibility": "PUBLIC", 
-                                 "journal-title": None, 
-                                 "work-external-identifiers": {
-                                  "scope": None, 
-                                  "work-external-identifier": [
-                                   {
-                                    "work-external-identifier-id": {
-                                     "value": "2016APh....72...11W"
-                                    }, 
-                                    "work-external-identifier-type": "BIBCODE"
-                                   }, 
-                                   {
-                                    "work-external-identifier-id": {
-                                     "value": "11002538"
-                                    }, 
-                                    "work-external-identifier-type": "OTHER_ID"
-                                   }, 
-                                   {
-                                    "work-external-identifier-id": {
-                                     "value": "10.1016/j.astropartphys.2015.04.008"
-                                    }, 
-                                    "work-external-identifier-type": "DOI"
-                                   }
-                                  ]
-                                 }, 
-                                 "url": {
-                                  "value": "https://ui.adsabs.harvard.edu/#abs/2016APh....72...11W"
-                                 }, 
-                                 "short-description": "We present studies for optimizing the next generation of ground-based imaging atmospheric Cherenkov telescopes (IACTs).", 
-                                 "work-contributors": {
-                                  "contributor": [
-                                   {
-                                    "contributor-orcid": None, 
-                                    "contributor-attributes": {
-                                     "contributor-role": "AUTHOR", 
-                                     "contributor-sequence": None
-                                    }, 
-                                    "credit-name": {
-                                     "visibility": "PUBLIC", 
-                                     "value": "Wood, M."
-                                    }, 
-                                    "contributor-email": None
-                                   }, 
-                                   {
-                                    "contributor-orcid": None, 
-                                    "contributor-attributes": {
-                                     "contributor-role": "AUTHOR", 
-                                     "contributor-sequence": None
-                                    }, 
-                                    "credit-name": {
-                                     "visibility": "PUBLIC", 
-                                     "value": "Jogler, T."
-                                    }, 
-                                    "contributor-email": None
-                                   }, 
-                                   {
-                                    "contributor-orcid": None, 
-                                    "contributor-attributes": {
-                                     "contributor-role": "AUTHOR", 
-                                     "contributor-sequence": None
-                                    }, 
-                                    "credit-name": {
-                                     "visibility": "PUBLIC", 
-                                     "value": "Dumm, J."
-                                    }, 
-                                    "contributor-email": None
-                                   }, 
-                                   {
-                                    "contributor-orcid": None, 
-                                    "contributor-attributes": {
-                                     "contributor-role": "AUTHOR", 
-                                     "contributor-sequence": None
-                                    }, 
-                                    "credit-name": {
-                                     "visibility": "PUBLIC", 
-                                     "value": "Funk, S."
-                                    }, 
-                                    "contributor-email": None
-                                   }
-                                  ]
-                                 }, 
-                                 "work-source": None
-                                }
-                               ]
-                            }
-                         }
-                  } 
-                }
+    new_data = works_payload([sample_work])
     
     # replace all works
     r = bumblebee_user.put('/orcid/%s/orcid-works' % orcid, 
-                            headers={'Orcid-Authorization': 'Bearer %s' % access_token},
+                            headers=orcid_headers(access),
                             json=new_data)
     assert r.status_code == 200
     
     # over-write the one
     r = bumblebee_user.post('/orcid/%s/orcid-works' % orcid, 
-                            headers={'Orcid-Authorization': 'Bearer %s' % access_token},
+                            headers=orcid_headers(access),
                             json=new_data)
     assert r.status_code == 201
     
     # get it back
-    r = bumblebee_user.get('/orcid/%s/orcid-profile' % orcid, headers={'Orcid-Authorization': 'Bearer %s' % access_token})
+    r = bumblebee_user.get('/orcid/%s/orcid-profile' % orcid, headers=orcid_headers(access))
     assert 'orcid-profile' in r.json()
     assert r.status_code == 200
     assert len(extract_works(r.json())) == 1
+    index = ProfileIndex.from_profile(r.json())
+    assert index.diff(['2016APh....72...11W'], client_id=authenticated_user.get_config('ORCID_CLIENT_ID')) == (set(), set())
+    assert len(index.find('DOI', '10.1016/J.ASTROPARTPHYS.2015.04.008')) == 1
     
 
 def extract_works(orcid_data):
-    # orcid data is awful
-    out = []
-    for x in orcid_data['orcid-profile']['orcid-activities']['orcid-works']['orcid-work']:
-        if 'source' in x and \
-            x['source'] and \
-            'source-client-id' in x['source'] and \
-            x['source']['source-client-id'] and \
-            'path' in x['source']['source-client-id'] and \
-            x['source']['source-client-id']['path'] == authenticated_user.get_config('ORCID_CLIENT_ID'):
-            out.append(x)
-    return out
+    # the works ADS added
+    return ProfileIndex.from_profile(orcid_data).source(authenticated_user.get_config('ORCID_CLIENT_ID'))
 
 
 def test_crossx_headers():
@@ -0,0 +1,28 @@
+from ..user_roles import authenticated_user
+
+# a sort with a unique tie breaker, both kinds of paging give the same order
+params = {'q': 'star', 'fl': 'id,bibcode', 'sort': 'date desc, id asc'}
+
+def test_paging():
+    # Walk through the first 35 results 10 at a time, following the cursor
+    pages = list(authenticated_user.search_pages(params, rows=10, limit=35))
+    # which takes four pages, the last one has the remaining 5
+    assert [len(r.json()['response']['docs']) for r in pages] == [10, 10, 10, 5]
+    by_cursor = [doc['id'] for r in pages for doc in r.json()['response']['docs']]
+    # no document is returned twice
+    assert len(set(by_cursor)) == 35
+    # paging by start/rows gives the same documents
+    by_start = [doc['id'] for doc in authenticated_user.search(params, rows=10, cursor=False, limit=35)]
+    assert by_start == by_cursor
+
+def test_bigquery():
+    # Search within a list of bibcodes that is sent as it is generated,
+    # the last one does not exist
+    bibcodes = ['1993CoPhC..74..239H', '1994GPC.....9...69H', '2012ASPC..461..763H', 'not-a-bibcode']
+    r = authenticated_user.bigquery({'q': '*:*', 'fl': 'bibcode', 'rows': 10},
+                                    (b for b in bibcodes), chunk=2)
+    assert r.status_code == 200
+    # Only the existing ones are found
+    response = r.json()['response']
+    assert response['numFound'] == 3
+    assert sorted(doc['bibcode'] for doc in response['docs']) == sorted(bibcodes[0:3])
@@ -1,10 +1,17 @@
-from ..user_roles import anonymous_user, authenticated_user, bumblebee_user
+from ..user_roles import anonymous_user, authenticated_user
+from .. import matrix
+from .. import schema
+from ..schema import Values, keys
 from unittest import TestCase
     
 # We will do all tests for the famous author A. Accomazzi
 params = {}
 params['q'] = 'author:"Accomazzi,A" year:1991-1993'
 
+# We are sent back a dictionary, each entry of this dictionary
+# is a dictionary with expected keys
+word_cloud_schema = schema.compile(Values(keys(['idf','record_count','total_occurrences'])))
+
 class VisServiceTest(TestCase):
     def test_anonymous_user(self):
         # Get the word cloud
@@ -18,18 +25,7 @@ class VisServiceTest(TestCase):
         # We should get a 200 back
         self.assertEqual(r.status_code, 200)
         # Now we'll test the contents of what was sent back
-        data = r.json()
-        # We are sent back a dictionary
-        self.assertIsInstance(data, dict)
-        # Each entry of this dictionary is a dictionary
-        expected_attr = ['idf','record_count','total_occurrences']
-        for entry in data.values():
-            self.assertIsInstance(entry, dict)
-            # With expected keys
-            self.assertItemsEqual(expected_attr, entry.keys())
+        word_cloud_schema.validate(r.json())
 
-    def test_authenticated_user(self):
-        self.check_word_cloud()
 
-    def test_bumblebee_user(self):
-        self.check_word_cloud(user=bumblebee_user)
+test_roles = matrix.roles_test('word_cloud', VisServiceTest, 'check_word_cloud')
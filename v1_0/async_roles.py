@@ -0,0 +1,69 @@
+# Non-blocking counterparts of the user roles: get/post/put/options return
+# a pending result at once and many requests can be in flight from a single
+# process. The requests themselves go through the same blocking path as
+# the other roles (update_args, update_kwargs, send) on a thread pool.
+#
+#   pending = [async_authenticated_user.get('/graphics/%s' % b) for b in bibcodes]
+#   for r in gather(pending):
+#       assert r.status_code == 200
+
+from multiprocessing.pool import ThreadPool
+from . import config
+from .user_roles import AnonymousUser, AuthenticatedUser, BumblebeeAnonymousUser
+
+
+class AsyncMixin(object):
+
+    concurrency = config.ASYNC_CONCURRENCY
+
+    def create_session(self, pool_maxsize=None):
+        # one keep-alive connection per thread
+        pool_maxsize = max(pool_maxsize or config.POOL_MAXSIZE, self.concurrency)
+        return super(AsyncMixin, self).create_session(pool_maxsize=pool_maxsize)
+
+    @property
+    def pool(self):
+        # started on first use, importing the module starts no threads
+        if getattr(self, '_pool', None) is None:
+            self._pool = ThreadPool(self.concurrency)
+        return self._pool
+
+    def submit(self, method, url, **kwargs):
+        return self.pool.apply_async(self.request, (method, url), kwargs)
+
+    def get(self, url, params=None, **kwargs):
+        return self.submit('GET', url, params=params, **kwargs)
+
+    def post(self, url, data=None, json=None, **kwargs):
+        return self.submit('POST', url, data=data, json=json, **kwargs)
+
+    def put(self, url, data=None, **kwargs):
+        return self.submit('PUT', url, data=data, **kwargs)
+
+    def options(self, url, **kwargs):
+        return self.submit('OPTIONS', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.submit('DELETE', url, **kwargs)
+
+
+class AsyncAnonymousUser(AsyncMixin, AnonymousUser):
+    pass
+
+
+class AsyncAuthenticatedUser(AsyncMixin, AuthenticatedUser):
+    pass
+
+
+class AsyncBumblebeeAnonymousUser(AsyncMixin, BumblebeeAnonymousUser):
+    pass
+
+
+def gather(pending, timeout=None):
+    # waits for all results in order; a request that raised raises here
+    return [p.get(timeout) for p in pending]
+
+
+async_anonymous_user = AsyncAnonymousUser()
+async_authenticated_user = AsyncAuthenticatedUser()
+async_bumblebee_user = AsyncBumblebeeAnonymousUser()
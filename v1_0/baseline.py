@@ -0,0 +1,211 @@
+# Latency history: the endpoint timings of every run are appended to a
+# sqlite file (BASELINE_DB), with the API_URL, the version the API reported
+# and the day. Every run is compared to the runs before it against the same
+# API_URL; an endpoint has regressed when its latency is both an outlier
+# among the previous BASELINE_RUNS runs (robust z-score above BASELINE_Z)
+# and slower than their median by BASELINE_MIN_SLOWDOWN and BASELINE_MIN_DELTA.
+#
+#   python -m v1_0.baseline runs
+#   python -m v1_0.baseline trend '/metrics' --metric p95
+#   python -m v1_0.baseline check
+
+import sys
+import time
+import sqlite3
+import argparse
+import datetime
+
+from . import config
+
+METRICS = ['mean', 'p50', 'p95', 'p99']
+
+
+def median(values):
+    values = sorted(values)
+    n = len(values)
+    return values[n // 2] if n % 2 else (values[n // 2 - 1] + values[n // 2]) / 2.0
+
+
+def robust_z(value, history):
+    # distance from the median in (scaled) median absolute deviations; the
+    # deviation is at least 1% of the median, identical runs are not
+    # infinitely precise
+    m = median(history)
+    mad = median([abs(v - m) for v in history]) * 1.4826
+    return (value - m) / max(mad, 0.01 * m, 1e-9)
+
+
+class History(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute('CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, '
+                        'started REAL, day TEXT, api_url TEXT, version TEXT)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS endpoints (run INTEGER, endpoint TEXT, '
+                        'count INTEGER, errors INTEGER, mean REAL, p50 REAL, p95 REAL, p99 REAL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS endpoints_run ON endpoints (run, endpoint)')
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def record(self, api_url, version, stats, started=None):
+        # stats as returned by Recorder.stats(); returns the id of the run
+        started = started or time.time()
+        day = datetime.datetime.utcfromtimestamp(started).strftime('%Y-%m-%d')
+        cursor = self.db.execute('INSERT INTO runs (started, day, api_url, version) '
+                                 'VALUES (?, ?, ?, ?)', (started, day, api_url, version))
+        run = cursor.lastrowid
+        self.db.executemany('INSERT INTO endpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                            [(run, name, s['count'], s['errors'], s['mean'],
+                              s['p50'], s['p95'], s['p99']) for name, s in stats.items()])
+        self.db.commit()
+        return run
+
+    def runs(self, api_url=None, limit=20):
+        sql = 'SELECT id, started, day, api_url, version FROM runs'
+        args = ()
+        if api_url:
+            sql += ' WHERE api_url = ?'
+            args = (api_url,)
+        rows = self.db.execute(sql + ' ORDER BY id DESC LIMIT ?', args + (limit,)).fetchall()
+        return list(reversed(rows))
+
+    def run(self, run):
+        return self.db.execute('SELECT id, started, day, api_url, version FROM runs '
+                               'WHERE id = ?', (run,)).fetchone()
+
+    def trend(self, endpoint, api_url=None, metric='p50', limit=30):
+        # [(run, day, version, count, value)], oldest first
+        assert metric in METRICS
+        sql = ('SELECT runs.id, runs.day, runs.version, endpoints.count, endpoints.%s '
+               'FROM endpoints JOIN runs ON runs.id = endpoints.run '
+               'WHERE endpoints.endpoint = ?' % metric)
+        args = (endpoint,)
+        if api_url:
+            sql += ' AND runs.api_url = ?'
+            args += (api_url,)
+        rows = self.db.execute(sql + ' ORDER BY runs.id DESC LIMIT ?', args + (limit,)).fetchall()
+        return list(reversed(rows))
+
+    def regressions(self, run, metric=None, runs=None, min_runs=None, z=None,
+                    min_slowdown=None, min_delta=None):
+        # the endpoints of a run that are slower than their baseline, the
+        # runs before it against the same api
+        metric = metric or config.BASELINE_METRIC
+        runs = runs or config.BASELINE_RUNS
+        min_runs = min_runs or config.BASELINE_MIN_RUNS
+        z = z or config.BASELINE_Z
+        min_slowdown = config.BASELINE_MIN_SLOWDOWN if min_slowdown is None else min_slowdown
+        min_delta = config.BASELINE_MIN_DELTA if min_delta is None else min_delta
+        assert metric in METRICS
+        api_url = self.run(run)[3]
+        previous = [r[0] for r in self.db.execute(
+            'SELECT id FROM runs WHERE api_url = ? AND id < ? ORDER BY id DESC LIMIT ?',
+            (api_url, run, runs))]
+        if not previous:
+            return []
+        history = {}
+        for endpoint, value in self.db.execute(
+                'SELECT endpoint, %s FROM endpoints WHERE run IN (%s)' % (
+                    metric, ','.join('?' * len(previous))), previous):
+            history.setdefault(endpoint, []).append(value)
+        out = []
+        for endpoint, value in self.db.execute(
+                'SELECT endpoint, %s FROM endpoints WHERE run = ? ORDER BY endpoint' % metric, (run,)):
+            values = history.get(endpoint, [])
+            if len(values) < min_runs:
+                continue
+            base = median(values)
+            score = robust_z(value, values)
+            if score > z and value > base * (1 + min_slowdown) and value - base > min_delta:
+                out.append({'endpoint': endpoint, 'metric': metric, 'value': value,
+                            'baseline': base, 'runs': len(values), 'z': score,
+                            'slowdown': value / base - 1})
+        return out
+
+
+def api_version(user):
+    # what the api says it is, '' when it doesn't say
+    for url in ('/harbour/version', '/status'):
+        try:
+            r = user.get(url)
+            if r.status_code == 200:
+                return r.text.strip()[0:200]
+        except Exception:
+            pass
+    return ''
+
+
+def record_session(stats, version):
+    # appends the stats of a test run to BASELINE_DB and returns its
+    # regressions; version() is the api version, asked only when the run is
+    # recorded. Runs that replay (or record) a cassette are left out, their
+    # latencies aren't the api's
+    if not config.BASELINE_DB or not stats or config.CASSETTE_MODE:
+        return []
+    history = History(config.BASELINE_DB)
+    try:
+        run = history.record(config.API_URL, version(), stats)
+        return history.regressions(run)
+    finally:
+        history.close()
+
+
+def report(regressions):
+    return ['%-44s %s %8.1f ms, baseline %8.1f ms over %d runs (+%.0f%%, z=%.1f)' % (
+            r['endpoint'][0:44], r['metric'], r['value'] * 1000, r['baseline'] * 1000,
+            r['runs'], 100 * r['slowdown'], r['z']) for r in regressions]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Latency history of the test runs')
+    parser.add_argument('--db', default=config.BASELINE_DB)
+    parser.add_argument('--api-url', help='only runs against this api')
+    commands = parser.add_subparsers(dest='command')
+    runs = commands.add_parser('runs', help='list the recorded runs')
+    runs.add_argument('--limit', type=int, default=20)
+    trend = commands.add_parser('trend', help='one endpoint over the runs')
+    trend.add_argument('endpoint', help="e.g. '/metrics' or 'POST /metrics'")
+    trend.add_argument('--metric', choices=METRICS, default='p50')
+    trend.add_argument('--limit', type=int, default=30)
+    check = commands.add_parser('check', help='compare a run with its baseline')
+    check.add_argument('--run', type=int, help='the run id, the last one by default')
+    check.add_argument('--metric', choices=METRICS)
+    args = parser.parse_args(argv)
+
+    history = History(args.db)
+    if args.command == 'runs':
+        for run, started, day, api_url, version in history.runs(args.api_url, args.limit):
+            print('%5d  %s  %s  %s' % (run, day, api_url, version.replace('\n', ' ')[0:60]))
+    elif args.command == 'trend':
+        endpoints = [args.endpoint]
+        if ' ' not in args.endpoint:
+            endpoints = [r[0] for r in history.db.execute(
+                'SELECT DISTINCT endpoint FROM endpoints WHERE endpoint LIKE ?',
+                ('% ' + args.endpoint,))]
+        for endpoint in endpoints:
+            rows = history.trend(endpoint, args.api_url, args.metric, args.limit)
+            top = max([r[4] for r in rows] + [1e-9])
+            print('%s (%s)' % (endpoint, args.metric))
+            for run, day, version, count, value in rows:
+                print('%5d  %s %6d %9.1f ms  %s' % (run, day, count, value * 1000,
+                                                    '#' * int(round(40 * value / top))))
+    elif args.command == 'check':
+        last = history.runs(args.api_url, 1)
+        run = args.run or (last and last[-1][0])
+        if not run:
+            print('No runs in %s' % args.db)
+            return 0
+        regressions = history.regressions(run, metric=args.metric)
+        for line in report(regressions) or ['No regressions in run %d' % run]:
+            print(line)
+        return 1 if regressions else 0
+    else:
+        parser.print_help()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,232 @@
+# Scaling benchmarks: an endpoint is called with inputs of geometrically
+# growing size, every response is still checked the way the functional tests
+# check it, and the measurements are fitted to a power law
+#
+#   latency ~ size ** exponent
+#
+# An exponent around 1 is linear growth, anything above BENCH_SUPERLINEAR is
+# flagged. The benchmarks only run with RUN_BENCHMARKS = True:
+#
+#   py.test v1_0/bench
+
+import math
+import json
+import warnings
+import threading
+from collections import OrderedDict
+
+import pytest
+
+from .. import config
+from ..soak import rss_kb
+
+
+def benchmark(test):
+    # only runs with RUN_BENCHMARKS, within BENCH_DEADLINE
+    test = pytest.mark.deadline(config.BENCH_DEADLINE)(test)
+    return pytest.mark.skipif(not config.RUN_BENCHMARKS,
+                              reason='benchmarks only run with RUN_BENCHMARKS')(test)
+
+
+# all curves measured in this process, in the order they were recorded
+curves = []
+
+
+class SuperlinearGrowth(UserWarning):
+    pass
+
+
+def sizes(largest, factor=10, smallest=1):
+    # sizes(10000) -> [1, 10, 100, 1000, 10000]
+    out = []
+    size = smallest
+    while size < largest:
+        out.append(int(size))
+        size *= factor
+    out.append(int(largest))
+    return out
+
+
+def median(values):
+    values = sorted(values)
+    n = len(values)
+    if not n:
+        return None
+    return values[n // 2] if n % 2 else (values[n // 2 - 1] + values[n // 2]) / 2.0
+
+
+def fit(xs, ys):
+    # least squares fit of log(y) = a + b * log(x), returns the exponent b
+    points = [(math.log(x), math.log(y)) for x, y in zip(xs, ys) if x > 0 and y > 0]
+    if len(points) < 2:
+        return None
+    n = float(len(points))
+    mx = sum(p[0] for p in points) / n
+    my = sum(p[1] for p in points) / n
+    sxx = sum((p[0] - mx) ** 2 for p in points)
+    if not sxx:
+        return None
+    return sum((p[0] - mx) * (p[1] - my) for p in points) / sxx
+
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# seconds between two samples of the resident size, without tracemalloc
+SAMPLE_INTERVAL = 0.005
+
+
+class PeakMemory(object):
+    # the peak memory in kB taken while the block runs: the python
+    # allocations where tracemalloc exists (it slows everything down, don't
+    # time the same run), otherwise (python 2) the growth of the resident
+    # size, sampled from a thread every SAMPLE_INTERVAL seconds
+    #
+    #   with PeakMemory() as memory:
+    #       ...
+    #   memory.kb
+
+    def __enter__(self):
+        self.kb = None
+        if tracemalloc is not None:
+            tracemalloc.start()
+            return self
+        self.start = self.peak = rss_kb()
+        self.done = threading.Event()
+        self.sampler = threading.Thread(target=self.sample)
+        self.sampler.daemon = True
+        self.sampler.start()
+        return self
+
+    def sample(self):
+        while not self.done.wait(SAMPLE_INTERVAL):
+            self.peak = max(self.peak, rss_kb())
+
+    def __exit__(self, *exc_info):
+        if tracemalloc is not None:
+            self.kb = tracemalloc.get_traced_memory()[1] / 1024.0
+            tracemalloc.stop()
+            return
+        self.peak = max(self.peak, rss_kb())
+        self.done.set()
+        self.sampler.join()
+        self.kb = max(self.peak - self.start, 0.0)
+
+
+_corpus = []
+
+def corpus(n, user=None):
+    # the first n bibcodes of the benchmark corpus
+    if len(_corpus) < n:
+        if config.BENCH_CORPUS:
+            with open(config.BENCH_CORPUS) as f:
+                bibcodes = [line.strip() for line in f if line.strip()]
+        else:
+            bibcodes = search_corpus(n, user)
+        del _corpus[:]
+        _corpus.extend(bibcodes)
+    if len(_corpus) < n:
+        raise ValueError('The benchmark corpus has %d bibcodes, %d are needed' % (len(_corpus), n))
+    return _corpus[:n]
+
+
+def search_corpus(n, user=None):
+    if user is None:
+        from ..user_roles import authenticated_user as user
+    params = {'q': config.BENCH_CORPUS_QUERY, 'fl': 'bibcode', 'sort': 'bibcode asc'}
+    return [doc['bibcode'] for doc in user.search(params, limit=n)]
+
+
+class Curve(object):
+    # measurements of one endpoint, one row per input size; 'fit_from' is
+    # the size from which on the exponents are fitted, below it the fixed
+    # cost of a request hides the cost per item
+
+    def __init__(self, name, x='size', fit_from=None):
+        self.name = name
+        self.x = x
+        self.fit_from = fit_from
+        self.rows = []
+
+    def add(self, size, **values):
+        row = OrderedDict([(self.x, size)])
+        row.update(sorted(values.items()))
+        self.rows.append(row)
+        return row
+
+    @property
+    def columns(self):
+        columns = []
+        for row in self.rows:
+            columns.extend(c for c in row if c != self.x and c not in columns)
+        return columns
+
+    def exponent(self, column):
+        rows = [r for r in self.rows if column in r and r[column] is not None]
+        if self.fit_from is not None:
+            rows = [r for r in rows if r[self.x] >= self.fit_from]
+        return fit([r[self.x] for r in rows], [r[column] for r in rows])
+
+    def superlinear(self):
+        # the columns that grow faster than BENCH_SUPERLINEAR allows
+        return [c for c in self.columns
+                if (self.exponent(c) or 0) > config.BENCH_SUPERLINEAR]
+
+    def summary(self):
+        return OrderedDict([
+            ('name', self.name),
+            ('x', self.x),
+            ('fit_from', self.fit_from),
+            ('rows', self.rows),
+            ('exponents', OrderedDict((c, self.exponent(c)) for c in self.columns)),
+            ('superlinear', self.superlinear()),
+        ])
+
+    def dump(self):
+        # plain lists and dicts, the way xdist workers send them back
+        return {'name': self.name, 'x': self.x, 'fit_from': self.fit_from,
+                'rows': [list(r.items()) for r in self.rows]}
+
+    @classmethod
+    def load(cls, data):
+        curve = cls(data['name'], data['x'], data['fit_from'])
+        curve.rows = [OrderedDict((k, v) for k, v in r) for r in data['rows']]
+        return curve
+
+    def report(self):
+        columns = self.columns
+        width = max([12] + [len(c) + 1 for c in columns])
+        cell = '%%%ds' % width
+        lines = [('%-12s' % self.x) + ''.join(cell % c for c in columns)]
+        for row in self.rows:
+            lines.append(('%-12s' % row[self.x]) +
+                         ''.join(cell % ('%.4g' % row[c] if row.get(c) is not None else '-')
+                                 for c in columns))
+        flagged = self.superlinear()
+        exponents = [self.exponent(c) for c in columns]
+        lines.append(('%-12s' % 'exponent') +
+                     ''.join(cell % ('-' if e is None else
+                                     '%.2f%s' % (e, ' !' if c in flagged else ''))
+                             for c, e in zip(columns, exponents)))
+        return lines
+
+
+def record(curve):
+    # registers a finished curve for the report and warns about
+    # superlinear growth
+    curves.append(curve)
+    flagged = curve.superlinear()
+    if flagged:
+        warnings.warn(SuperlinearGrowth('%s grows superlinearly with the %s: %s' % (
+            curve.name, curve.x, ', '.join('%s ~ n^%.2f' % (c, curve.exponent(c))
+                                           for c in flagged))))
+    return curve
+
+
+def write_json(path, **extra):
+    data = dict(extra)
+    data['curves'] = [c.summary() for c in curves]
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
@@ -0,0 +1,54 @@
+import time
+from ..user_roles import authenticated_user
+from .. import config
+from ..api.biblib import temporary_library, read_library, change_documents, library_name
+from . import benchmark, corpus, sizes, median, Curve, record
+
+
+@benchmark
+def test_library_scaling(user=authenticated_user):
+    # Add batches of 1, 10, ... BENCH_BIBLIB_MAX bibcodes to one library and
+    # read all of it back after every batch, then remove the same batches
+    # again. The library is deleted whatever happens
+    batches = sizes(config.BENCH_BIBLIB_MAX)
+    bibcodes = corpus(sum(batches), user)
+    documents = Curve('POST /biblib/documents/<library>', 'batch', fit_from=100)
+    readback = Curve('GET /biblib/libraries/<library>', 'documents', fit_from=100)
+    with temporary_library(user, name=library_name('adsrex-bench')) as library:
+        added, offset = [], 0
+        timings = {}
+        for batch in batches:
+            chunk = bibcodes[offset:offset + batch]
+            offset += batch
+            start = time.time()
+            assert change_documents(user, library, 'add', chunk) == batch
+            timings[batch] = [time.time() - start]
+            added.extend(chunk)
+
+            latency = []
+            for i in range(config.BENCH_REPEAT):
+                start = time.time()
+                content = read_library(user, library)
+                latency.append(time.time() - start)
+                assert len(content) == len(added) and set(content) == set(added), \
+                    '%d of %d bibcodes read back' % (len(set(content) & set(added)), len(added))
+            pages = -(-len(added) // config.BIBLIB_PAGE_ROWS)
+            readback.add(len(added), latency_ms=median(latency) * 1000, pages=pages,
+                         per_page_ms=median(latency) * 1000 / pages)
+
+        # the largest batches first, the library shrinks the way it grew
+        offset = len(added)
+        for batch in reversed(batches):
+            chunk = added[offset - batch:offset]
+            offset -= batch
+            start = time.time()
+            assert change_documents(user, library, 'remove', chunk) == batch
+            timings[batch].append(time.time() - start)
+        assert read_library(user, library) == []
+
+    for batch in batches:
+        add, remove = timings[batch]
+        documents.add(batch, add_ms=add * 1000, remove_ms=remove * 1000,
+                      added_per_s=batch / add, removed_per_s=batch / remove)
+    record(documents)
+    record(readback)
@@ -0,0 +1,60 @@
+import os
+import time
+import tempfile
+import itertools
+from ..user_roles import authenticated_user
+from .. import config
+from . import benchmark, search_corpus, sizes, median, PeakMemory, Curve, record
+
+
+def corpus_file(n, user):
+    # BENCH_CORPUS, or a temporary file written from the corpus query as
+    # it is paged through; returns (path, temporary)
+    if config.BENCH_CORPUS:
+        return config.BENCH_CORPUS, False
+    fd, path = tempfile.mkstemp(prefix='adsrex-bigquery-', suffix='.txt')
+    with os.fdopen(fd, 'w') as f:
+        for bibcode in search_corpus(n, user):
+            f.write(bibcode + '\n')
+    return path, True
+
+
+def upload(user, path, size):
+    # the first size bibcodes of the file, read while they are sent
+    with open(path) as f:
+        return user.bigquery({'q': '*:*', 'fl': 'bibcode', 'rows': 2000},
+                             itertools.islice(f, size))
+
+
+@benchmark
+def test_upload_scaling(user=authenticated_user):
+    # Upload 1, 10, ... BENCH_BIGQUERY_MAX bibcodes of the corpus; all of
+    # them have to be found, the client memory should not grow with the
+    # size of the upload
+    path, temporary = corpus_file(config.BENCH_BIGQUERY_MAX, user)
+    try:
+        with open(path) as f:
+            available = sum(1 for line in f if line.strip())
+        assert available >= config.BENCH_BIGQUERY_MAX, \
+            'The benchmark corpus has %d bibcodes, %d are needed' % (available, config.BENCH_BIGQUERY_MAX)
+        curve = Curve('POST /search/bigquery', 'bibcodes', fit_from=1000)
+        for size in sizes(config.BENCH_BIGQUERY_MAX):
+            latency, wall = [], []
+            for i in range(config.BENCH_REPEAT):
+                start = time.time()
+                r = upload(user, path, size)
+                wall.append(time.time() - start)
+                assert r.status_code == 200, '%d bibcodes: %s' % (size, r.text[0:200])
+                response = r.json()['response']
+                assert response['numFound'] == size
+                assert len(set(d['bibcode'] for d in response['docs'])) == min(size, 2000)
+                latency.append(r.elapsed.total_seconds() * 1000)
+            # separately, tracing allocations would distort the timings
+            with PeakMemory() as memory:
+                upload(user, path, size)
+            curve.add(size, latency_ms=median(latency), bibcodes_per_s=size / median(wall),
+                      client_kb=memory.kb)
+    finally:
+        if temporary:
+            os.remove(path)
+    record(curve)
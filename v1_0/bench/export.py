@@ -0,0 +1,60 @@
+import re
+import zlib
+import pytest
+from ..user_roles import authenticated_user
+from .. import config
+from . import benchmark, corpus, sizes, median, Curve, record
+
+# every record of a format starts with a line like these
+RECORD_START = {
+    'bibtex': r'@\w+\{',
+    'aastex': r'\\bibitem',
+    'icarus': r'\\bibitem',
+    'mnras': r'\\bibitem',
+    'soph': r'\\bibitem',
+    'endnote': r'%0 ',
+    'ris': r'TY  - ',
+}
+RECORD_START = dict((f, re.compile('^' + p, re.M)) for f, p in RECORD_START.items())
+
+# Retrieved 100 abstracts, starting with number 1.
+RETRIEVED = re.compile(r'Retrieved (\d+) abstracts')
+
+
+def wire_bytes(r):
+    # what came over the network, before the body was decompressed
+    raw = getattr(r, 'raw', None)
+    if raw is not None and hasattr(raw, 'tell'):
+        return raw.tell()
+    return int(r.headers.get('content-length') or len(r.content))
+
+
+def gzipped(content):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(content) + compressor.flush()
+
+
+@benchmark
+@pytest.mark.parametrize('format', sorted(RECORD_START))
+def test_export_scaling(format, user=authenticated_user):
+    # Export 1, 10, ... BENCH_EXPORT_MAX bibcodes of the corpus; every export
+    # has to contain a record for each of them
+    bibcodes = corpus(config.BENCH_EXPORT_MAX, user)
+    curve = Curve('POST /export/%s' % format, 'bibcodes', fit_from=10)
+    for size in sizes(config.BENCH_EXPORT_MAX):
+        latency, wire = [], []
+        for i in range(config.BENCH_REPEAT):
+            r = user.post('/export/%s' % format, json={'bibcode': bibcodes[0:size]})
+            assert r.status_code == 200, '%d bibcodes: %s' % (size, r.text[0:200])
+            data = r.json()
+            assert int(RETRIEVED.search(data['msg']).group(1)) == size
+            records = len(RECORD_START[format].findall(data['export']))
+            assert records == size, '%d records in the %s of %d bibcodes' % (records, format, size)
+            latency.append(r.elapsed.total_seconds() * 1000)
+            wire.append(wire_bytes(r) / 1024.0)
+        curve.add(size, latency_ms=median(latency),
+                  records_per_s=size / (median(latency) / 1000.0),
+                  raw_kb=len(r.content) / 1024.0, wire_kb=median(wire),
+                  gzip_kb=len(gzipped(r.content)) / 1024.0,
+                  gzip=int('gzip' in (r.headers.get('content-encoding') or '')))
+    record(curve)
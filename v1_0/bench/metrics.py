@@ -0,0 +1,34 @@
+from ..user_roles import authenticated_user
+from ..api.metrics import metrics_shape
+from .. import schema
+from .. import config
+from . import benchmark, corpus, sizes, median, Curve, record
+
+# not a bibcode, it has to come back in 'skipped bibcodes' at every size
+unknown = 'not-a-bibcode'
+
+
+@benchmark
+def test_payload_scaling(user=authenticated_user):
+    # Post the metrics of 1, 10, 100, ... bibcodes of the corpus; whole
+    # libraries are sent to the service this way
+    validator = schema.compile(metrics_shape(skipped=[unknown]))
+    curve = Curve('POST /metrics', 'bibcodes', fit_from=100)
+    library = corpus(config.BENCH_METRICS_MAX, user)
+    for size in sizes(config.BENCH_METRICS_MAX):
+        bibcodes = library[0:size] + [unknown]
+        latency, length, decode = [], [], []
+        for i in range(config.BENCH_REPEAT):
+            r = user.post('/metrics', json={'bibcodes': bibcodes})
+            assert r.status_code == 200, '%d bibcodes: %s' % (size, r.text[0:200])
+            # every response is checked like the one of the functional test
+            validator.validate(r.json())
+            latency.append(r.elapsed.total_seconds() * 1000)
+            length.append(len(r.content) / 1024.0)
+            decode.append(r.decode_time * 1000)
+        curve.add(size, latency_ms=median(latency), response_kb=median(length),
+                  decode_ms=median(decode))
+        # an empty list of bibcodes is still refused
+        r = user.post('/metrics', json={'bibcodes': []})
+        assert r.status_code == 403
+    record(curve)
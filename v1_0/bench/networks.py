@@ -0,0 +1,61 @@
+from ..user_roles import authenticated_user
+from ..api.paper_network import paper_network_schema
+from ..api.author_network import author_network_schema
+from .. import config
+from . import benchmark, corpus, sizes, median, Curve, record
+
+
+def graph_errors(graph, name_key):
+    # Integrity of a fullGraph in one pass over the nodes and one over the
+    # links: node names are unique and every link connects two existing
+    # nodes, referenced by their index or by their name
+    errors = []
+    nodes = graph['nodes']
+    names = set()
+    for i, node in enumerate(nodes):
+        name = node.get(name_key)
+        if name in names:
+            errors.append('nodes[%d]: duplicate node %r' % (i, name))
+        names.add(name)
+    for i, link in enumerate(graph['links']):
+        for end in ('source', 'target'):
+            ref = link.get(end)
+            if isinstance(ref, int):
+                ok = 0 <= ref < len(nodes)
+            else:
+                ok = ref in names
+            if not ok:
+                errors.append('links[%d].%s: no node %r' % (i, end, ref))
+    return errors
+
+
+def scaling(endpoint, validator, name_key, user):
+    curve = Curve('POST %s' % endpoint, 'bibcodes', fit_from=10)
+    bibcodes = corpus(config.BENCH_NETWORK_MAX, user)
+    for size in sizes(config.BENCH_NETWORK_MAX):
+        latency, length, decode = [], [], []
+        for i in range(config.BENCH_REPEAT):
+            r = user.post(endpoint, json={'bibcodes': bibcodes[0:size]})
+            assert r.status_code == 200, '%d bibcodes: %s' % (size, r.text[0:200])
+            data = validator.validate(r.json())
+            graph = data['data']['fullGraph']
+            errors = graph_errors(graph, name_key)
+            assert not errors, '%d bibcodes, %d broken:\n  %s' % (
+                size, len(errors), '\n  '.join(errors[0:20]))
+            latency.append(r.elapsed.total_seconds() * 1000)
+            length.append(len(r.content) / 1024.0)
+            decode.append(r.decode_time * 1000)
+        curve.add(size, nodes=len(graph['nodes']), links=len(graph['links']),
+                  latency_ms=median(latency), response_kb=median(length),
+                  decode_ms=median(decode))
+    return record(curve)
+
+
+@benchmark
+def test_paper_network_scaling(user=authenticated_user):
+    scaling('/vis/paper-network', paper_network_schema, 'node_name', user)
+
+
+@benchmark
+def test_author_network_scaling(user=authenticated_user):
+    scaling('/vis/author-network', author_network_schema, 'nodeName', user)
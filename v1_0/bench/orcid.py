@@ -0,0 +1,109 @@
+import io
+import copy
+import json
+import time
+from ..user_roles import authenticated_user, bumblebee_user
+from .. import config
+from ..api.orcid import orcid_access, orcid_headers, works_payload, sample_work, extract_works
+from ..orcid_index import ProfileIndex
+from . import benchmark, corpus, sizes, median, Curve, record
+
+def works(bibcodes):
+    # the sample work once per bibcode, identified by the bibcode alone
+    out = []
+    for bibcode in bibcodes:
+        work = copy.deepcopy(sample_work)
+        work['work-title']['title']['value'] = 'adsrex benchmark work %s' % bibcode
+        work['work-external-identifiers']['work-external-identifier'] = [{
+            'work-external-identifier-id': {'value': bibcode},
+            'work-external-identifier-type': 'BIBCODE'}]
+        work['url']['value'] = 'https://ui.adsabs.harvard.edu/#abs/%s' % bibcode
+        out.append(work)
+    return out
+
+
+@benchmark
+def test_works_scaling(user=bumblebee_user):
+    # Replace the works of the test profile with 1, 10, ... BENCH_ORCID_MAX
+    # works (PUT), push the same works again as an update (POST) and read
+    # the profile back; every work has to be there exactly once. The
+    # profile is left without works
+    access = orcid_access()
+    url = '/orcid/%s/orcid-works' % access['orcid']
+    profile = '/orcid/%s/orcid-profile' % access['orcid']
+    bibcodes = corpus(config.BENCH_ORCID_MAX, authenticated_user)
+    curve = Curve('PUT /orcid/<orcid_id>/orcid-works', 'works', fit_from=10)
+    try:
+        for size in sizes(config.BENCH_ORCID_MAX):
+            payload = works_payload(works(bibcodes[0:size]))
+            put, post, get = [], [], []
+            for i in range(config.BENCH_REPEAT):
+                r = user.put(url, headers=orcid_headers(access), json=payload)
+                assert r.status_code == 200, '%d works: %s' % (size, r.text[0:200])
+                put.append(r.elapsed.total_seconds() * 1000)
+                r = user.post(url, headers=orcid_headers(access), json=payload)
+                assert r.status_code == 201, '%d works: %s' % (size, r.text[0:200])
+                post.append(r.elapsed.total_seconds() * 1000)
+                r = user.get(profile, headers=orcid_headers(access))
+                assert r.status_code == 200, r.text[0:200]
+                found = extract_works(r.json())
+                assert len(found) == size, '%d works pushed, %d in the profile' % (size, len(found))
+                get.append(r.elapsed.total_seconds() * 1000)
+            curve.add(size, put_ms=median(put), post_ms=median(post), profile_ms=median(get),
+                      works_per_s=size / (median(put) / 1000.0),
+                      payload_kb=len(json.dumps(payload)) / 1024.0)
+    finally:
+        user.put(url, headers=orcid_headers(access), json=works_payload([]))
+    record(curve)
+
+
+def synthetic_profile(n):
+    # n works with made up bibcodes; every third was added by another client,
+    # every fifth is private and every tenth work has the bibcode of the
+    # one before it; returns the profile, the bibcodes in it and the ones
+    # on works of ORCID_CLIENT_ID
+    bibcodes = ['%04dadsrx%010dS' % (1990 + i % 30, i) for i in range(n)]
+    out = works(bibcodes)
+    for i, work in enumerate(out):
+        if i % 3 == 2:
+            work['source']['source-client-id']['path'] = 'APP-OTHER'
+        if i % 5 == 4:
+            work['visibility'] = 'PRIVATE'
+        if i % 10 == 9:
+            work['work-external-identifiers']['work-external-identifier'] = \
+                copy.deepcopy(out[i - 1]['work-external-identifiers']['work-external-identifier'])
+    ours = [b for i, b in enumerate(bibcodes) if i % 3 != 2 and i % 10 != 9] + \
+           [bibcodes[i - 1] for i in range(n) if i % 10 == 9 and i % 3 != 2]
+    return works_payload(out), [b for i, b in enumerate(bibcodes) if i % 10 != 9], set(ours)
+
+
+@benchmark
+def test_profile_index_scaling():
+    # Index synthetic profiles of 10 ... BENCH_ORCID_PROFILE_MAX works, from
+    # the decoded profile and streamed from its json, then look up every
+    # bibcode and diff the ADS works against the expected bibcodes; all of
+    # it has to grow linearly with the profile
+    curve = Curve('orcid profile index', 'works', fit_from=100)
+    for size in sizes(config.BENCH_ORCID_PROFILE_MAX, smallest=10):
+        data, bibcodes, ours = synthetic_profile(size)
+        raw = json.dumps(data).encode('utf-8')
+        build, stream, lookup, diff = [], [], [], []
+        for i in range(config.BENCH_REPEAT):
+            start = time.time()
+            index = ProfileIndex.from_profile(data)
+            build.append(time.time() - start)
+            start = time.time()
+            assert len(ProfileIndex.from_stream(io.BytesIO(raw))) == size
+            stream.append(time.time() - start)
+            start = time.time()
+            for bibcode in bibcodes:
+                assert index.find('BIBCODE', bibcode)
+            lookup.append(time.time() - start)
+            start = time.time()
+            missing, extra = index.diff(bibcodes, client_id=config.ORCID_CLIENT_ID)
+            diff.append(time.time() - start)
+        assert extra == set() and missing == set(bibcodes) - ours
+        assert len(index.source(config.ORCID_CLIENT_ID)) == size - size // 3
+        curve.add(size, build_ms=median(build) * 1000, stream_ms=median(stream) * 1000,
+                  lookup_ms=median(lookup) * 1000, diff_ms=median(diff) * 1000)
+    record(curve)
@@ -0,0 +1,47 @@
+import time
+from ..user_roles import authenticated_user
+from .. import config
+from . import benchmark, sizes, median, Curve, record
+
+
+def depth_scaling(name, user, cursor):
+    # Pages through BENCH_SEARCH_DEPTH documents of the corpus query; the
+    # pages are grouped by how deep they start (doubling bins), every bin
+    # reports its page latency and the documents per second over its pages
+    params = {'q': config.BENCH_CORPUS_QUERY, 'fl': 'id,bibcode', 'sort': 'bibcode asc, id asc'}
+    edges = sizes(config.BENCH_SEARCH_DEPTH, factor=2, smallest=config.BENCH_SEARCH_ROWS)
+    curve = Curve(name, 'depth')
+    seen = set()
+    latency, docs, wall = [], 0, 0.0
+    depth = numfound = 0
+    start = time.time()
+    for r in user.search_pages(params, rows=config.BENCH_SEARCH_ROWS, cursor=cursor,
+                               limit=config.BENCH_SEARCH_DEPTH):
+        response = r.json()['response']
+        page, numfound = response['docs'], response['numFound']
+        for doc in page:
+            assert doc['id'] not in seen, 'document %s returned twice' % doc['id']
+            seen.add(doc['id'])
+        latency.append(r.elapsed.total_seconds() * 1000)
+        docs += len(page)
+        depth += len(page)
+        now = time.time()
+        wall += now - start
+        start = now
+        if depth >= edges[0] or len(page) < config.BENCH_SEARCH_ROWS:
+            curve.add(depth, page_ms=median(latency), docs_per_s=docs / wall)
+            latency, docs, wall = [], 0, 0.0
+            while edges and edges[0] <= depth:
+                edges.pop(0)
+    assert len(seen) == min(numfound, config.BENCH_SEARCH_DEPTH)
+    return record(curve)
+
+
+@benchmark
+def test_cursor_depth(user=authenticated_user):
+    depth_scaling('GET /search/query (cursorMark)', user, cursor=True)
+
+
+@benchmark
+def test_start_rows_depth(user=authenticated_user):
+    depth_scaling('GET /search/query (start/rows)', user, cursor=False)
@@ -0,0 +1,122 @@
+import time
+import uuid
+import threading
+from ..user_roles import authenticated_user
+from .. import config
+from ..timing import percentile
+from . import benchmark, sizes, Curve, record
+
+
+def concurrently(clients, work):
+    # runs work(i) in that many threads, released at the same moment;
+    # returns their results in order
+    results = [None] * clients
+    gate = threading.Event()
+
+    def run(i):
+        gate.wait()
+        results[i] = work(i)
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    gate.set()
+    for t in threads:
+        t.join()
+    return results
+
+
+def timed_post(user, url, data):
+    # (start, end, response)
+    start = time.time()
+    r = user.post(url, json=data)
+    return start, time.time(), r
+
+
+def restore_user_data(user, original):
+    # puts back the values the bench- keys had before; the API can't delete
+    # a key, the ones that didn't exist are set to null
+    current = user.get('/vault/user-data').json()
+    changed = dict((key, original.get(key)) for key in current
+                   if key.startswith('bench-') and current[key] != original.get(key))
+    if changed:
+        r = user.post('/vault/user-data', json=changed)
+        assert r.status_code == 200, r.text[0:200]
+
+
+@benchmark
+def test_user_data_contention(user=authenticated_user):
+    # Every client writes its own keys and, in between, one key all of them
+    # share. Afterwards no write may be lost and the shared key has to hold
+    # a value that was written last: no other write started after it was
+    # acknowledged. The bench- keys get their old values back afterwards
+    curve = Curve('POST /vault/user-data', 'clients')
+    writes = config.BENCH_VAULT_WRITES
+    original = user.get('/vault/user-data').json()
+    try:
+        for clients in sizes(config.BENCH_VAULT_CLIENTS, factor=2):
+            run = uuid.uuid4().hex[0:8]
+
+            def work(i):
+                done = []
+                for j in range(writes):
+                    value = '%s-%d-%d' % (run, i, j)
+                    for key in ('bench-%d-%d' % (i, j), 'bench-shared'):
+                        done.append((key, value) + timed_post(user, '/vault/user-data', {key: value}))
+                return done
+            start = time.time()
+            done = [w for client in concurrently(clients, work) for w in client]
+            elapsed = time.time() - start
+            for key, value, began, ended, r in done:
+                assert r.status_code == 200, r.text[0:200]
+                # a client reads its own writes
+                if key != 'bench-shared':
+                    assert r.json()[key] == value
+
+            data = user.get('/vault/user-data').json()
+            lost = [key for key, value, began, ended, r in done
+                    if key != 'bench-shared' and data.get(key) != value]
+            assert not lost, '%d of %d writes were lost: %s' % (
+                len(lost), clients * writes, ', '.join(lost[0:10]))
+            shared = [w for w in done if w[0] == 'bench-shared']
+            last_start = max(began for key, value, began, ended, r in shared)
+            winners = [value for key, value, began, ended, r in shared if ended >= last_start]
+            assert data['bench-shared'] in winners, \
+                '%s is not one of the last writes %s' % (data['bench-shared'], winners)
+
+            latency = sorted(w[-1].elapsed.total_seconds() for w in done)
+            curve.add(clients, writes_per_s=len(done) / elapsed,
+                      p50_ms=percentile(latency, 50) * 1000, p95_ms=percentile(latency, 95) * 1000)
+    finally:
+        restore_user_data(user, original)
+    record(curve)
+
+
+@benchmark
+def test_saved_query_contention(user=authenticated_user):
+    # Identical queries saved at the same time get the same qid, different
+    # ones different qids, and all of them can be read back
+    curve = Curve('POST /vault/query', 'clients')
+    for clients in sizes(config.BENCH_VAULT_CLIENTS, factor=2):
+        run = uuid.uuid4().hex[0:8]
+        same = {'q': 'bibstem:ApJ year:%s' % run, 'sort': 'date desc'}
+
+        def work(i):
+            return [timed_post(user, '/vault/query', same),
+                    timed_post(user, '/vault/query', {'q': 'bibstem:ApJ year:%s-%d' % (run, i)})]
+        start = time.time()
+        done = concurrently(clients, work)
+        elapsed = time.time() - start
+        for pair in done:
+            for began, ended, r in pair:
+                assert r.status_code == 200, r.text[0:200]
+        qids = set(pair[0][2].json()['qid'] for pair in done)
+        assert len(qids) == 1, 'one query was saved as %d qids' % len(qids)
+        distinct = set(pair[1][2].json()['qid'] for pair in done)
+        assert len(distinct) == clients and not distinct & qids
+        for qid in qids | distinct:
+            assert user.get('/vault/query/%s' % qid).status_code == 200
+
+        latency = sorted(r.elapsed.total_seconds() for pair in done for began, ended, r in pair)
+        curve.add(clients, writes_per_s=2 * clients / elapsed,
+                  p50_ms=percentile(latency, 50) * 1000, p95_ms=percentile(latency, 95) * 1000)
+    record(curve)
@@ -0,0 +1,193 @@
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from .token_store import private_dir
+
+# only these request headers can change the response, the rest (user agent,
+# connection, content-length...) is left out of the fingerprint
+FINGERPRINT_HEADERS = ('authorization', 'orcid-authorization', 'content-type', 'accept')
+# credentials are part of the fingerprint (hashed) but never stored
+REDACTED_HEADERS = ('authorization', 'orcid-authorization', 'cookie', 'set-cookie')
+
+
+class CassetteMiss(requests.exceptions.ConnectionError):
+    pass
+
+
+def _bytes(value):
+    if value is None:
+        return b''
+    if isinstance(value, bytes):
+        return value
+    return value.encode('utf-8')
+
+
+def canonical_url(url):
+    # the order of query parameters doesn't matter
+    if '?' not in url:
+        return url
+    base, query = url.split('?', 1)
+    return base + '?' + '&'.join(sorted(query.split('&')))
+
+
+def canonical_body(body, content_type):
+    body = _bytes(body)
+    if body and 'json' in (content_type or ''):
+        try:
+            return _bytes(json.dumps(json.loads(body.decode('utf-8')), sort_keys=True))
+        except ValueError:
+            pass
+    return body
+
+
+def relevant_headers(headers):
+    return dict((k.lower(), v) for k, v in headers.items() if k.lower() in FINGERPRINT_HEADERS)
+
+
+def redacted(headers):
+    return dict((k, '<redacted>' if k.lower() in REDACTED_HEADERS else v)
+                for k, v in headers.items())
+
+
+def fingerprint(request):
+    headers = relevant_headers(request.headers)
+    h = hashlib.sha1()
+    h.update(_bytes(request.method.upper()))
+    h.update(b'\n' + _bytes(canonical_url(request.url)))
+    for name in sorted(headers):
+        h.update(b'\n' + _bytes(name) + b':' + _bytes(headers[name]))
+    h.update(b'\n\n' + canonical_body(request.body, headers.get('content-type')))
+    return h.hexdigest()
+
+
+class Cassette(object):
+    # All interactions live in one sqlite file, bodies are zlib compressed.
+    # For replay the whole table is read once into a dict keyed by the
+    # request fingerprint; bodies stay compressed until they are served.
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self._db = None
+        self._index = None
+
+    @property
+    def db(self):
+        if self._db is None:
+            private_dir(self.path)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute('PRAGMA synchronous = OFF')
+            self._db.execute('CREATE TABLE IF NOT EXISTS interactions ('
+                             'fingerprint TEXT PRIMARY KEY, method TEXT, url TEXT, '
+                             'request_headers TEXT, request_body BLOB, '
+                             'status INTEGER, reason TEXT, headers TEXT, body BLOB)')
+            self._db.execute('CREATE TABLE IF NOT EXISTS tokens ('
+                             'key TEXT PRIMARY KEY, value TEXT, expires REAL)')
+        return self._db
+
+    def lookup(self, key):
+        with self.lock:
+            if self._index is None:
+                self._index = {}
+                for row in self.db.execute('SELECT fingerprint, status, reason, headers, body '
+                                           'FROM interactions'):
+                    self._index[row[0]] = row[1:]
+        return self._index.get(key)
+
+    def record(self, key, request, response):
+        row = (key, request.method, request.url,
+               json.dumps(redacted(relevant_headers(request.headers))),
+               sqlite3.Binary(zlib.compress(_bytes(request.body))),
+               response.status_code, response.reason,
+               json.dumps(redacted(response.headers)),
+               sqlite3.Binary(zlib.compress(response.content)))
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO interactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', row)
+            self.db.commit()
+            if self._index is not None:
+                self._index[key] = row[5:]
+
+
+class CassetteTokenStore(object):
+    # The bootstrap token used while recording is kept in the cassette, a
+    # replay then sends exactly the requests that were recorded (the anonymous
+    # bootstrap responses in the cassette all carry different tokens)
+
+    def __init__(self, cassette, mode):
+        self.cassette = cassette
+        self.mode = mode
+
+    def get(self, key, fetch):
+        with self.cassette.lock:
+            row = self.cassette.db.execute('SELECT value, expires FROM tokens WHERE key = ?',
+                                           (key,)).fetchone()
+            if row and (self.mode == 'replay' or row[1] > time.time()):
+                return row[0]
+        if self.mode == 'replay':
+            raise CassetteMiss('No bootstrap token for %s in the cassette %s' % (
+                               key, self.cassette.path))
+        # the bootstrap request itself is recorded, so fetch outside the lock
+        value, expires = fetch()
+        with self.cassette.lock:
+            self.cassette.db.execute('INSERT OR REPLACE INTO tokens VALUES (?, ?, ?)',
+                                     (key, value, expires))
+            self.cassette.db.commit()
+        return value
+
+
+class CassetteAdapter(HTTPAdapter):
+    # mode 'record' talks to the server and stores every exchange,
+    # 'replay' answers from the cassette and never opens a connection
+
+    def __init__(self, cassette, mode, **kwargs):
+        self.cassette = cassette
+        self.mode = mode
+        HTTPAdapter.__init__(self, **kwargs)
+
+    def send(self, request, **kwargs):
+        if request.body is not None and not isinstance(request.body, (bytes, type(u''))):
+            # a streamed body is read here, it has to be fingerprinted and stored
+            request.body = b''.join(_bytes(chunk) for chunk in request.body)
+            request.headers.pop('Transfer-Encoding', None)
+            request.headers['Content-Length'] = str(len(request.body))
+        key = fingerprint(request)
+        if self.mode == 'replay':
+            hit = self.cassette.lookup(key)
+            if hit is None:
+                raise CassetteMiss('%s %s is not in the cassette %s' % (
+                                   request.method, request.url, self.cassette.path),
+                                   request=request)
+            return self.replay(request, *hit)
+        response = HTTPAdapter.send(self, request, **kwargs)
+        self.cassette.record(key, request, response)
+        return response
+
+    def replay(self, request, status, reason, headers, body):
+        response = Response()
+        response.status_code = status
+        response.reason = reason
+        response.headers = CaseInsensitiveDict(json.loads(headers))
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = zlib.decompress(bytes(body))
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+
+_cassettes = {}
+
+def load(path):
+    # one cassette per file, shared by all user roles
+    if path not in _cassettes:
+        _cassettes[path] = Cassette(path)
+    return _cassettes[path]
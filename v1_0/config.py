@@ -1,3 +1,4 @@
+import os
 
 # The main endpoint including the version, ie. https://api.adsabs.harvard.edu/v1 
 API_URL = 'http://adsws-staging.elasticbeanstalk.com/v1'
@@ -10,7 +11,175 @@ API_URL = 'http://adsws-staging.elasticbeanstalk.com/v1'
 AUTHENTICATED_USER_EMAIL = 'tester@ads'
 AUTHENTICATED_USER_ACCESS_TOKEN = ''
 
+# For parallel runs (py.test -n) give every worker its own account: each
+# process leases one of these tokens (the lease files live in the directory
+# TOKEN_LEASES), so rate limits and server side user data are not shared
+# between workers. When there are more workers than tokens, the remaining
+# ones share them
+AUTHENTICATED_USER_ACCESS_TOKENS = []
+TOKEN_LEASES = 'leases'
 
+# Tokens and other state shared by the test runs of this user are kept in
+# this directory, it is created readable by the user only. The relative
+# file names of TOKEN_LEASES, BOOTSTRAP_TOKEN_CACHE, RATELIMIT_STATE,
+# CASSETTE and ORCID_TOKEN_CACHE are taken inside it (after local_config)
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'adsrex')
+
+
+# Every user role keeps its own pooled keep-alive session; POOL_CONNECTIONS is
+# the number of per-host pools that are cached, POOL_MAXSIZE the number of
+# connections kept open to a single host. With POOL_BLOCK the maxsize becomes
+# a hard per-host limit (otherwise extra connections are opened and discarded)
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 10
+POOL_BLOCK = False
+
+
+# Number of requests the async user roles keep in flight at the same time
+ASYNC_CONCURRENCY = 20
+
+# The Bumblebee bootstrap token is fetched on first use (not at import) and
+# shared by all test processes through this file until it expires; set to
+# None to bootstrap once per process instead. Tokens are refreshed this many
+# seconds before they expire, BOOTSTRAP_TOKEN_TTL is used when the response
+# doesn't say when the token expires
+BOOTSTRAP_TOKEN_CACHE = 'bootstrap-tokens.json'
+BOOTSTRAP_TOKEN_MARGIN = 60
+BOOTSTRAP_TOKEN_TTL = 3600
+
+# (connect, read) timeouts in seconds of every request, ROUTE_TIMEOUTS
+# overrides them per endpoint ('POST /search/bigquery' or a route alone).
+# Every test has to be done within TEST_DEADLINE seconds (None for no
+# deadline); pytest.mark.deadline(seconds) gives a test another one, the
+# benchmarks have BENCH_DEADLINE
+TIMEOUT = (5, 60)
+ROUTE_TIMEOUTS = {
+    'POST /search/bigquery': (5, 600),
+    'POST /metrics': (5, 300),
+    'POST /biblib/documents/<library>': (5, 300),
+}
+TEST_DEADLINE = 300
+BENCH_DEADLINE = None
+
+# With HEDGE a GET that takes longer than the HEDGE_PERCENTILE of its route
+# (once there are HEDGE_MIN_SAMPLES latencies) is sent again and the first
+# response wins; only the HEDGE_ROUTES, or every GET when that is None
+HEDGE = False
+HEDGE_ROUTES = ['/graphics/<bibcode>', '/recommender/<bibcode>', '/vault/execute_query/<queryid>']
+HEDGE_PERCENTILE = 95
+HEDGE_MIN_SAMPLES = 20
+
+# The user roles pace themselves by the x-ratelimit-* headers of the API. The
+# budget of every access token is shared by all test processes through the
+# RATELIMIT_STATE file (None turns pacing off). Once fewer than
+# RATELIMIT_PACE_BELOW requests are left they are spread evenly until the
+# reset, the last RATELIMIT_RESERVE are not used at all. A 429 is retried
+# after the reset up to RATELIMIT_RETRIES times; a request that would have to
+# wait longer than RATELIMIT_MAX_WAIT seconds fails with RateLimitExhausted
+RATELIMIT_STATE = 'ratelimit.json'
+RATELIMIT_RESERVE = 10
+RATELIMIT_PACE_BELOW = 200
+RATELIMIT_RETRIES = 1
+RATELIMIT_MAX_WAIT = 300
+
+# Record/replay of the API traffic: with 'record' every request/response pair
+# is stored in the CASSETTE file, with 'replay' the responses are served from
+# there without any network (requests that were never recorded fail); None
+# talks to API_URL as usual. Credential headers are not stored, but the
+# bootstrap and orcid tokens used while recording are, so keep the file
+# private (not in the repository)
+CASSETTE_MODE = None
+CASSETTE = 'cassette.sqlite'
+
+# Every request is timed per endpoint; the summary is printed at the end of
+# the run and written to this json file (None to skip the file)
+TIMING_REPORT = 'timing-report.json'
+
+# With PHASE_TIMING every request is timed in phases (dns, connect, tls, time
+# to first byte, download, json decode; see phases.py) and the p50s are
+# printed at the end of the run. PHASE_LOG logs every request's phases,
+# PHASE_CSV appends them to this file. Not with CASSETTE_MODE
+PHASE_TIMING = False
+PHASE_LOG = False
+PHASE_CSV = None
+
+# The endpoint timings of every run are added to this sqlite history (None
+# turns it off) and compared with the runs before it against the same
+# API_URL: a latency (BASELINE_METRIC, one of mean/p50/p95/p99) regressed
+# when its robust z-score among the last BASELINE_RUNS runs is above
+# BASELINE_Z and it is BASELINE_MIN_SLOWDOWN (a fraction) and at least
+# BASELINE_MIN_DELTA seconds slower than their median. Endpoints with fewer
+# than BASELINE_MIN_RUNS previous runs are not judged. Regressions are
+# printed, with BASELINE_FAIL they fail the run. Benchmark runs are not added
+BASELINE_DB = 'timing-history.sqlite'
+BASELINE_METRIC = 'p50'
+BASELINE_RUNS = 10
+BASELINE_MIN_RUNS = 5
+BASELINE_Z = 3.5
+BASELINE_MIN_SLOWDOWN = 0.2
+BASELINE_MIN_DELTA = 0.005
+BASELINE_FAIL = False
+
+# Importing the user roles happens while collecting the tests, it must not do
+# any network I/O and should stay well below this many seconds
+COLLECTION_TIME_BUDGET = 2.0
+
+
+# Page size of the search iterators of the user roles (search, search_pages)
+SEARCH_PAGE_ROWS = 2000
+# Bibcodes per chunk of the streamed /search/bigquery uploads
+BIGQUERY_CHUNK = 1000
+
+# Endurance runs (python -m v1_0.soak) take a sample every SOAK_INTERVAL
+# seconds. They flag latency that grows by more than SOAK_LATENCY_DRIFT (a
+# fraction) over the run, client memory growing by more than SOAK_RSS_DRIFT
+# MB per hour, an error rate that grows by more than SOAK_ERROR_DRIFT, and
+# intervals with more than SOAK_ERROR_BURST errors becoming more frequent
+SOAK_INTERVAL = 60
+SOAK_LATENCY_DRIFT = 0.2
+SOAK_RSS_DRIFT = 10.0
+SOAK_ERROR_DRIFT = 0.01
+SOAK_ERROR_BURST = 0.05
+
+# The scaling benchmarks in v1_0/bench are skipped unless RUN_BENCHMARKS is
+# set. Their bibcodes come from BENCH_CORPUS, a file with one bibcode per
+# line, or (when that is None) from the results of BENCH_CORPUS_QUERY. Every
+# size is measured BENCH_REPEAT times; curves that grow faster than
+# size ** BENCH_SUPERLINEAR are flagged. The results are printed at the end
+# of the run and written to BENCH_REPORT (None to skip the file)
+RUN_BENCHMARKS = False
+BENCH_CORPUS = None
+BENCH_CORPUS_QUERY = 'year:2000-2015 property:refereed'
+BENCH_REPEAT = 3
+BENCH_SUPERLINEAR = 1.2
+BENCH_REPORT = 'bench-report.json'
+# largest number of bibcodes posted to /metrics
+BENCH_METRICS_MAX = 10000
+# largest number of bibcodes posted to the paper and author networks
+BENCH_NETWORK_MAX = 1000
+# number of documents paged through by the search benchmark, and per page
+BENCH_SEARCH_DEPTH = 100000
+BENCH_SEARCH_ROWS = 2000
+# largest number of bibcodes uploaded to /search/bigquery
+BENCH_BIGQUERY_MAX = 500000
+# largest number of bibcodes exported at once, in every format
+BENCH_EXPORT_MAX = 2000
+# most clients writing vault user data and saved queries at the same time,
+# and the writes of every client
+BENCH_VAULT_CLIENTS = 32
+BENCH_VAULT_WRITES = 10
+# largest batch of bibcodes added to (and removed from) a library at once
+BENCH_BIBLIB_MAX = 20000
+# largest number of works pushed to orcid-works at once
+BENCH_ORCID_MAX = 1000
+# largest synthetic profile indexed, in works
+BENCH_ORCID_PROFILE_MAX = 20000
+
+# libraries are read back in pages of this many bibcodes
+BIBLIB_PAGE_ROWS = 1000
+# a registered user that may be given access to the test libraries; other
+# users have to exist, without one the permissions are not changed
+BIBLIB_COLLABORATOR = None
 
 # Those values are necessary only to test 'getting of the access token'
 # Orcid service does this inside browser, redirects the user to the correct
@@ -24,6 +193,11 @@ ORCID_CLIENT_ID = ''
 ORCID_USER = ''
 # The password in plain text
 ORCID_PASS = ''
+# The access token and orcid id exchanged for the login code are shared by
+# the test runs through this file (None logs in every time), for at most
+# ORCID_TOKEN_TTL seconds; orcid itself lets them live for years
+ORCID_TOKEN_CACHE = 'orcid-tokens.json'
+ORCID_TOKEN_TTL = 7 * 86400
 
 
 # Override config with local_config values
@@ -36,3 +210,9 @@ try:
             g[x] = getattr(local_config, x)
 except:
     pass
+
+# the state files follow CACHE_DIR, also when local_config changes it
+for x in ('TOKEN_LEASES', 'BOOTSTRAP_TOKEN_CACHE', 'RATELIMIT_STATE', 'CASSETTE',
+          'ORCID_TOKEN_CACHE'):
+    if globals()[x]:
+        globals()[x] = os.path.join(CACHE_DIR, globals()[x])
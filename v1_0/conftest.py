@@ -0,0 +1,132 @@
+import pytest
+from collections import OrderedDict
+from .user_roles import anonymous_user, authenticated_user, bumblebee_user
+from .async_roles import async_anonymous_user, async_authenticated_user, async_bumblebee_user
+from .timing import recorder
+from .phases import aggregator
+from . import config
+from . import bench
+from . import baseline
+from . import timeouts
+from . import hedging
+from . import matrix
+
+roles = [('anonymous', anonymous_user),
+         ('authenticated', authenticated_user),
+         ('bumblebee', bumblebee_user),
+         ('async anonymous', async_anonymous_user),
+         ('async auth', async_authenticated_user),
+         ('async bumblebee', async_bumblebee_user)]
+
+# connection counters sent back by xdist workers
+worker_connections = {}
+
+# endpoints that are slower than in the previous runs
+regressions = []
+
+
+def connection_stats():
+    stats = OrderedDict()
+    for name, user in roles:
+        stats[name] = user.connection_stats()
+        for key, value in worker_connections.get(name, {}).items():
+            stats[name][key] += value
+    return stats
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    marker = item.get_closest_marker('deadline')
+    timeouts.start_deadline(marker.args[0] if marker else config.TEST_DEADLINE)
+    try:
+        yield
+    finally:
+        timeouts.clear_deadline()
+
+
+def pytest_sessionfinish(session):
+    workeroutput = getattr(session.config, 'workeroutput', None)
+    if workeroutput is not None:
+        # an xdist worker, the controller reports for everybody
+        workeroutput['timing'] = recorder.dump()
+        workeroutput['connections'] = dict(connection_stats())
+        workeroutput['bench'] = [c.dump() for c in bench.curves]
+        workeroutput['phases'] = aggregator.dump()
+        workeroutput['matrix'] = [m.dump() for m in matrix.results]
+        if hedging.hedger:
+            workeroutput['hedging'] = hedging.hedger.dump()
+        return
+    if config.TIMING_REPORT and recorder.samples:
+        recorder.write_json(config.TIMING_REPORT, api_url=config.API_URL)
+    if config.BENCH_REPORT and bench.curves:
+        bench.write_json(config.BENCH_REPORT, api_url=config.API_URL)
+    # benchmark runs would skew the baseline of the endpoints they hit
+    if recorder.samples and not bench.curves:
+        regressions.extend(baseline.record_session(
+            recorder.stats(), lambda: baseline.api_version(authenticated_user)))
+        if regressions and config.BASELINE_FAIL and session.exitstatus == 0:
+            session.exitstatus = 1
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_testnodedown(node, error):
+    output = getattr(node, 'workeroutput', {})
+    recorder.merge(output.get('timing', []))
+    for name, stats in output.get('connections', {}).items():
+        merged = worker_connections.setdefault(name, {})
+        for key, value in stats.items():
+            merged[key] = merged.get(key, 0) + value
+    bench.curves.extend(bench.Curve.load(c) for c in output.get('bench', []))
+    aggregator.merge(output.get('phases', []))
+    matrix.results.extend(matrix.ScenarioResult.load(m) for m in output.get('matrix', []))
+    if hedging.hedger:
+        hedging.hedger.merge(output.get('hedging', []))
+
+
+def pytest_terminal_summary(terminalreporter):
+    lines = []
+    for name, s in connection_stats().items():
+        if not s['requests']:
+            continue
+        lines.append('%-16s %5d requests over %4d connections (%.1f%% reused)' % (
+                     name, s['requests'], s['connections'],
+                     100.0 * s['reused'] / s['requests']))
+    if lines:
+        terminalreporter.write_sep('=', 'connection reuse')
+        for line in lines:
+            terminalreporter.write_line(line)
+
+    lines = recorder.report()
+    if lines:
+        terminalreporter.write_sep('=', 'endpoint latency')
+        for line in lines:
+            terminalreporter.write_line(line)
+
+    if regressions:
+        terminalreporter.write_sep('=', 'latency regressions', red=True)
+        for line in baseline.report(regressions):
+            terminalreporter.write_line(line)
+
+    if matrix.results:
+        terminalreporter.write_sep('=', 'role matrix')
+        for scenario in sorted(matrix.merged(matrix.results), key=lambda m: m.name):
+            for line in scenario.report():
+                terminalreporter.write_line(line)
+            terminalreporter.write_line('')
+
+    lines = hedging.hedger.report() if hedging.hedger else []
+    if lines:
+        terminalreporter.write_sep('=', 'hedged requests')
+        for line in lines:
+            terminalreporter.write_line(line)
+
+    lines = aggregator.report()
+    if lines:
+        terminalreporter.write_sep('=', 'request phases')
+        for line in lines:
+            terminalreporter.write_line(line)
+
+    for curve in bench.curves:
+        terminalreporter.write_sep('=', 'scaling: %s' % curve.name)
+        for line in curve.report():
+            terminalreporter.write_line(line)
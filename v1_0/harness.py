@@ -0,0 +1,409 @@
+# Checks of the test harness itself (they don't need a running API)
+import os
+import sys
+import subprocess
+from .user_roles import anonymous_user
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_import_does_no_io():
+    # every test module imports the user roles, so this is what collection
+    # costs; any attempt to resolve or connect a socket fails the import
+    code = '\n'.join([
+        'import socket, time',
+        'def no_io(*args, **kwargs):',
+        '    raise AssertionError("network I/O while importing user_roles")',
+        'socket.getaddrinfo = socket.create_connection = no_io',
+        'socket.socket.connect = socket.socket.connect_ex = no_io',
+        'start = time.time()',
+        'import v1_0.user_roles',
+        'print(time.time() - start)'])
+    out = subprocess.check_output([sys.executable, '-c', code], cwd=root)
+    elapsed = float(out.decode('ascii').strip().splitlines()[-1])
+    assert elapsed < anonymous_user.get_config('COLLECTION_TIME_BUDGET')
+
+
+def test_standin(monkeypatch):
+    from . import config
+    from . import timing
+    from .standin import start
+    from .user_roles import AnonymousUser, AuthenticatedUser
+    # talk to the stand-in even while the suite replays a cassette, and keep
+    # its latencies out of the report and the baseline of API_URL
+    monkeypatch.setattr(config, 'CASSETTE_MODE', None)
+    recorder = timing.recorder
+    before = len(recorder.samples.get(('POST', '/metrics'), []))
+    monkeypatch.setattr(timing, 'recorder', timing.Recorder())
+    server = start()
+    try:
+        anonymous, authenticated = AnonymousUser(), AuthenticatedUser()
+        anonymous.api_url = authenticated.api_url = server.url
+        authenticated.access_token = 'standin'
+        assert anonymous.post('/metrics', json={'bibcodes': ['1993CoPhC..74..239H']}).status_code == 401
+        r = authenticated.post('/metrics', json={'bibcodes': ['1993CoPhC..74..239H']})
+        assert r.status_code == 200
+        assert r.json()['skipped bibcodes'] == []
+        assert int(r.headers['x-ratelimit-remaining']) == int(r.headers['x-ratelimit-limit']) - 1
+        assert len(timing.recorder.samples[('POST', '/metrics')]) == 2
+        assert len(recorder.samples.get(('POST', '/metrics'), [])) == before
+    finally:
+        server.stop()
+
+
+def test_cassette(tmpdir):
+    import json
+    import requests
+    from .standin import start
+    from .cassette import Cassette, CassetteAdapter, CassetteMiss, fingerprint
+
+    def prepared(url, body, token='standin'):
+        return requests.Request('POST', url, data=body, headers={
+            'Authorization': 'Bearer %s' % token, 'Content-Type': 'application/json',
+            'User-Agent': 'whatever'}).prepare()
+    # neither the order of the parameters and json keys nor the other
+    # headers change the fingerprint, the token does
+    a = prepared('http://api/v1/metrics?a=1&b=2', '{"bibcodes": ["x"], "types": ["basic"]}')
+    b = prepared('http://api/v1/metrics?b=2&a=1', '{"types": ["basic"], "bibcodes": ["x"]}')
+    b.headers['User-Agent'] = 'other'
+    assert fingerprint(a) == fingerprint(b)
+    assert fingerprint(a) != fingerprint(prepared(a.url, a.body, token='other'))
+
+    def session(cassette, mode):
+        s = requests.Session()
+        s.mount('http://', CassetteAdapter(cassette, mode))
+        return s
+    body = {'bibcodes': ['1993CoPhC..74..239H']}
+    headers = {'Authorization': 'Bearer standin'}
+    path = str(tmpdir.join('cassette.sqlite'))
+    server = start()
+    try:
+        url = server.url + '/metrics'
+        recorded = session(Cassette(path), 'record').post(url, json=body, headers=headers)
+    finally:
+        server.stop()
+    assert recorded.status_code == 200
+    # replayed from a fresh cassette without the server, the credentials
+    # were not stored
+    replay = session(Cassette(path), 'replay')
+    r = replay.post(url, json=body, headers=headers)
+    assert (r.status_code, r.json()) == (recorded.status_code, recorded.json())
+    stored = Cassette(path).db.execute('SELECT request_headers FROM interactions').fetchall()
+    assert [json.loads(h)['authorization'] for h, in stored] == ['<redacted>']
+    try:
+        replay.post(url, json=body, headers={'Authorization': 'Bearer other'})
+        assert False, 'replayed another token'
+    except CassetteMiss:
+        pass
+
+
+def test_response_json(monkeypatch):
+    import json
+    import requests
+    from . import response
+    data = {u'response': {u'docs': [{u'bibcode': u'%04dadsrx%010dS' % (1990, i),
+                                     u'title': [u'\u00c5ngstr\u00f6m %d' % i], u'score': i / 7.0}
+                                    for i in range(2000)], u'numFound': 2000}}
+    for body in (json.dumps({u'title': u'\u00c5ngstr\u00f6m'}), json.dumps(data)):
+        raw = requests.models.Response()
+        raw._content = body.encode('utf-8')
+        raw.encoding = 'utf-8'
+        r = response.Response(raw, 'GET', '/search/query')
+        decodes = []
+
+        class Recorder(object):
+            def record_decode(self, *args):
+                decodes.append(args)
+        monkeypatch.setattr(response.timing, 'recorder', Recorder())
+        # decoded once, into what json would give, and shared afterwards
+        first = r.json()
+        assert first == json.loads(body) == raw.json()
+        assert r.json() is first and r.json() is first
+        assert len(decodes) == 1 and decodes[0][2] == r.decode_time
+        title = first.get(u'title') or first[u'response'][u'docs'][0][u'title'][0]
+        assert isinstance(title, type(u''))
+
+
+def test_temporary_library():
+    import pytest
+    from .api.biblib import temporary_library
+
+    class Response(object):
+        def __init__(self, status_code, data=None):
+            self.status_code, self.data, self.text = status_code, data, 'text'
+
+        def json(self):
+            return self.data
+
+    class User(object):
+        def post(self, url, json):
+            return Response(200, {'id': 'lib'})
+
+        def delete(self, url):
+            return Response(500)
+    # the error of the block comes through, the failed delete is a warning
+    with pytest.warns(UserWarning, match='library lib was not deleted'):
+        with pytest.raises(KeyError):
+            with temporary_library(User()) as library:
+                raise KeyError(library)
+
+
+def test_baseline(tmpdir):
+    from .baseline import History
+    history = History(str(tmpdir.join('history.sqlite')))
+    judge = dict(metric='p50', runs=10, min_runs=3, z=3.5, min_slowdown=0.2, min_delta=0.005)
+
+    def stats(p50):
+        return {'GET /metrics/<bibcode>': {'count': 10, 'errors': 0, 'mean': p50,
+                                           'p50': p50, 'p95': p50, 'p99': p50}}
+    # the usual noise is no regression
+    for p50 in (0.100, 0.104, 0.098, 0.101):
+        run = history.record('http://api/v1', 'v1.0', stats(p50))
+    assert history.regressions(run, **judge) == []
+    # twice as slow is
+    run = history.record('http://api/v1', 'v1.1', stats(0.2))
+    assert [r['endpoint'] for r in history.regressions(run, **judge)] == ['GET /metrics/<bibcode>']
+    # runs against another api have their own baseline
+    run = history.record('http://other/v1', 'v1.1', stats(0.5))
+    assert history.regressions(run, **judge) == []
+    assert [r[4] for r in history.trend('GET /metrics/<bibcode>', 'http://api/v1')][-2:] == [0.101, 0.2]
+
+
+def test_baseline_skips_cassettes(tmpdir, monkeypatch):
+    from . import config
+    from .baseline import History, record_session
+    path = str(tmpdir.join('history.sqlite'))
+    monkeypatch.setattr(config, 'BASELINE_DB', path)
+    stats = {'GET /metrics/<bibcode>': {'count': 1, 'errors': 0, 'mean': 0.001,
+                                       'p50': 0.001, 'p95': 0.001, 'p99': 0.001}}
+    for mode in ('replay', 'record'):
+        monkeypatch.setattr(config, 'CASSETTE_MODE', mode)
+        assert record_session(stats, lambda: 'v1') == []
+    assert History(path).runs() == []
+    monkeypatch.setattr(config, 'CASSETTE_MODE', None)
+    record_session(stats, lambda: 'v1')
+    assert [r[4] for r in History(path).runs()] == ['v1']
+
+
+def test_cache_dir():
+    # a CACHE_DIR from local_config moves the state files along, a path of
+    # their own (or None) is kept
+    code = '\n'.join([
+        'import sys, types, v1_0',
+        'local = types.ModuleType("v1_0.local_config")',
+        'local.CACHE_DIR, local.CASSETTE, local.ORCID_TOKEN_CACHE = "/x", "/y/c.sqlite", None',
+        'sys.modules["v1_0.local_config"] = v1_0.local_config = local',
+        'from v1_0 import config',
+        'print(" ".join(str(p) for p in (config.BOOTSTRAP_TOKEN_CACHE, config.RATELIMIT_STATE,',
+        '                                 config.CASSETTE, config.ORCID_TOKEN_CACHE)))'])
+    out = subprocess.check_output([sys.executable, '-c', code], cwd=root)
+    assert out.decode('ascii').split() == ['/x/bootstrap-tokens.json', '/x/ratelimit.json',
+                                           '/y/c.sqlite', 'None']
+
+
+def test_token_store(tmpdir):
+    import stat
+    import time
+    from .token_store import TokenStore
+    # the cache directory is created on first use, and nobody else can
+    # read it or the tokens
+    path = str(tmpdir.join('cache', 'tokens.json'))
+    store = TokenStore(path, margin=0)
+    assert store.get('k', lambda: ('secret', time.time() + 60)) == 'secret'
+    assert store.get('k', lambda: ('other', time.time() + 60)) == 'secret'
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(os.path.dirname(path)).st_mode) == 0o700
+    assert sorted(os.listdir(os.path.dirname(path))) == ['tokens.json', 'tokens.json.lock']
+
+
+def test_lease(tmpdir):
+    import hashlib
+    from .token_store import lease, _leases
+    directory = str(tmpdir.join('leases'))
+    # a lease file that can't be opened (here a directory) only skips its token
+    os.makedirs(os.path.join(directory, 'adsrex-lease-%s' % hashlib.sha1(b'a').hexdigest()[0:12]))
+    held = len(_leases)
+    try:
+        assert lease(['a', 'b'], directory) == 'b'
+        assert lease(['a', 'b'], directory) is None
+    finally:
+        while len(_leases) > held:
+            os.close(_leases.pop())
+
+
+def test_scheduler(tmpdir, monkeypatch):
+    import json
+    from . import ratelimit
+    from .ratelimit import Scheduler, RateLimitExhausted
+
+    class Clock(object):
+        now = 1000.0
+        waits = []
+
+        def time(self):
+            return self.now
+
+        def sleep(self, seconds):
+            self.waits.append(seconds)
+    clock = Clock()
+    monkeypatch.setattr(ratelimit, 'time', clock)
+
+    class Response(object):
+        def __init__(self, remaining, reset, status_code=200):
+            self.status_code = status_code
+            self.headers = {'x-ratelimit-remaining': str(remaining), 'x-ratelimit-reset': str(reset)}
+    path = str(tmpdir.join('ratelimit.json'))
+    scheduler = Scheduler(path, reserve=10, pace_below=200, max_wait=300)
+    # far from the limit nothing waits, and only a new window is written
+    assert scheduler.after('k', Response(4000, 1100)) is None
+    scheduler.before('k')
+    assert clock.waits == []
+    assert scheduler.after('k', Response(3999, 1100)) is None
+    assert json.load(open(path))['k'][0] == 4000
+    # 100 requests above the reserve in 100s: one a second
+    scheduler.after('k', Response(110, 1100))
+    for i in range(3):
+        scheduler.before('k')
+    assert clock.waits == [1.0, 2.0]
+    # a daily window with little budget left never waits longer than max_wait
+    del clock.waits[:]
+    scheduler.after('k', Response(150, 1000 + 86400))
+    for i in range(3):
+        scheduler.before('k')
+    assert clock.waits == [300, 300]
+    # the reserve waits for the reset, unless that is more than max_wait away
+    del clock.waits[:]
+    scheduler.after('k', Response(5, 1100))
+    scheduler.before('k')
+    assert clock.waits == [100]
+    scheduler.after('k', Response(5, 2000))
+    try:
+        scheduler.before('k')
+        assert False, 'not exhausted'
+    except RateLimitExhausted:
+        pass
+    # a 429 is retried after retry-after, or else after the reset
+    response = Response(0, 2000, status_code=429)
+    assert scheduler.after('k', response) == 1000
+    response.headers['retry-after'] = '7'
+    assert scheduler.after('k', response) == 7
+
+
+def test_peak_memory():
+    from .bench import PeakMemory
+    # 20 MB taken inside the block show up, with or without tracemalloc
+    with PeakMemory() as memory:
+        block = b'x' * (20 * 1024 * 1024)
+    assert 15 * 1024 < memory.kb < 40 * 1024, memory.kb
+    del block
+
+
+def test_orcid_index():
+    import io
+    import json
+    from .orcid_index import ProfileIndex
+
+    def work(client, visibility, *ids):
+        return {'source': {'source-client-id': {'path': client}} if client else None,
+                'visibility': visibility,
+                'work-external-identifiers': {'work-external-identifier': [
+                    {'work-external-identifier-type': t, 'work-external-identifier-id': {'value': v}}
+                    for t, v in ids]}}
+    profile = {'orcid-profile': {'orcid-activities': {'orcid-works': {'orcid-work': [
+        work('APP-ADS', 'PUBLIC', ('BIBCODE', '2016APh....72...11W'), ('DOI', '10.1016/J.X')),
+        work('APP-ADS', 'PRIVATE', ('BIBCODE', '2016APh....72...11W')),
+        work('APP-OTHER', 'PUBLIC', ('BIBCODE', '1995ApJ...447L..37W')),
+        work(None, 'PUBLIC'),
+    ]}}}}
+    for index in (ProfileIndex.from_profile(profile),
+                  ProfileIndex.from_stream(io.BytesIO(json.dumps(profile).encode('utf-8')))):
+        assert len(index) == 4
+        assert len(index.source('APP-ADS')) == 2 and len(index.source(None)) == 1
+        assert len(index.visibility('PRIVATE')) == 1
+        assert len(index.find('doi', '10.1016/j.x')) == 1
+        assert index.duplicates() == {'2016APh....72...11W': 2}
+        assert index.diff(['2016APh....72...11W', '2000A&A...1..1X'], client_id='APP-ADS') == \
+            (set(['2000A&A...1..1X']), set())
+        assert index.diff([]) == (set(), set(['2016APh....72...11W', '1995ApJ...447L..37W']))
+    assert len(ProfileIndex.from_profile({})) == 0
+
+
+def test_hedging():
+    import time
+    from .hedging import Hedger
+    hedger = Hedger(['/slow'], pct=50, min_samples=3)
+    assert hedger.applies('GET', '/slow') and not hedger.applies('POST', '/slow')
+    delays = [0.01, 0.01, 0.01, 0.5, 0.01]
+
+    def send():
+        time.sleep(delays.pop(0))
+        return 'response'
+    # no hedging before there are enough latencies
+    for i in range(3):
+        assert hedger.run('/slow', send) == 'response'
+    assert hedger.delay('/slow') < 0.1
+    # the first request stalls, the backup answers
+    start = time.time()
+    assert hedger.run('/slow', send) == 'response'
+    assert time.time() - start < 0.4
+    assert [row[0:4] for row in hedger.dump()] == [['/slow', 4, 1, 1]]
+
+
+def test_deadline():
+    import pytest
+    from . import timeouts
+    from .user_roles import BumblebeeAnonymousUser
+    # without the deadline of this test
+    timeouts.clear_deadline()
+    assert timeouts.timeout('POST', '/search/bigquery') == (5, 600)
+    timeouts.start_deadline(2)
+    try:
+        connect, read = timeouts.timeout('GET', '/metrics/<bibcode>')
+        assert connect <= 2 and read <= 2
+        timeouts.start_deadline(-1)
+        with pytest.raises(timeouts.DeadlineExceeded):
+            timeouts.timeout('GET', '/metrics/<bibcode>')
+        # the bumblebee bootstrap doesn't swallow it, or cache a failure
+        bumblebee = BumblebeeAnonymousUser()
+        bumblebee.token_store = None
+        with pytest.raises(timeouts.DeadlineExceeded):
+            bumblebee.access_token
+        timeouts.clear_deadline()
+        bumblebee.bootstrap = lambda: 1 / 0
+        assert bumblebee.access_token == ''
+        bumblebee.bootstrap = lambda: ('token', None)
+        assert bumblebee.access_token == 'token'
+    finally:
+        timeouts.clear_deadline()
+    assert timeouts.remaining() is None
+
+
+def test_matrix():
+    import pytest
+    from unittest import TestCase
+    from . import matrix, timing
+
+    def check(user):
+        # stands in for a scenario, the 'user' is the status it gets
+        timing.captured().append(('GET', '/graphics/<bibcode>', user, 0.01))
+        assert user == 200
+    roles = [('anonymous', 401), ('authenticated', 200), ('bumblebee', 200)]
+    scenario = matrix.run('graphics', check, roles=roles)
+    assert [r.outcome() for r in scenario.roles] == ['refused', 'passed', 'passed']
+    assert matrix.ScenarioResult.load(scenario.dump()).report() == scenario.report()
+    with pytest.raises(AssertionError) as e:
+        matrix.run('graphics', check, roles=[('anonymous', 200), ('bumblebee', 500)])
+    assert 'anonymous: expected only 401s, got [200]' in str(e.value)
+    assert 'bumblebee: Traceback' in str(e.value)
+    # runs of one role each end up in one table
+    for role, status in reversed(roles):
+        matrix.run('word_cloud', check, roles=[(role, status)])
+    table = [m for m in matrix.merged(matrix.results) if m.name == 'word_cloud']
+    assert [[r.role for r in m.roles] for m in table] == [['anonymous', 'authenticated', 'bumblebee']]
+    # the test_roles of the service tests, every role in one run
+
+    class Case(TestCase):
+        def check_graphics(self, user):
+            check(user)
+    matrix.roles_test('graphics', Case, 'check_graphics', roles=roles)()
+    assert [r.outcome() for r in matrix.results[-1].roles] == ['refused', 'passed', 'passed']
+    del matrix.results[-6:]
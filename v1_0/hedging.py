@@ -0,0 +1,137 @@
+# Hedged requests: with HEDGE a GET of the HEDGE_ROUTES (every GET when that
+# is None) that hasn't been answered after the HEDGE_PERCENTILE of the
+# latencies seen so far on its route is sent a second time, and whichever
+# response comes first is used. Both requests end up in the timing recorder,
+# so the latencies there still show the tail that hedging hides; the hedger
+# counts per route how often it hedged and how often the backup won.
+
+import sys
+import time
+import threading
+from collections import deque
+
+try:
+    from queue import Queue, Empty
+except ImportError:
+    from Queue import Queue, Empty
+
+from . import config
+from .timing import percentile
+
+# the delay of a route is recomputed after this many requests
+REFRESH = 20
+
+
+class Hedger(object):
+
+    def __init__(self, routes=None, pct=95, min_samples=20, window=1000):
+        self.routes = routes
+        self.pct = pct
+        self.min_samples = min_samples
+        self.window = window
+        self.lock = threading.Lock()
+        # route: {'times': the last window latencies, 'observed', 'delay',
+        #         'requests', 'hedged', 'won'}
+        self.stats = {}
+
+    def applies(self, method, route):
+        return method == 'GET' and (self.routes is None or route in self.routes)
+
+    def _route(self, route):
+        s = self.stats.get(route)
+        if s is None:
+            s = self.stats[route] = {'times': deque(maxlen=self.window), 'observed': 0,
+                                     'delay': None, 'requests': 0, 'hedged': 0, 'won': 0}
+        return s
+
+    def delay(self, route):
+        # None until the route has min_samples latencies
+        with self.lock:
+            return self._route(route)['delay']
+
+    def observe(self, route, elapsed):
+        # the latency of a first request, whether it was hedged or not
+        with self.lock:
+            s = self._route(route)
+            s['times'].append(elapsed)
+            s['observed'] += 1
+            if s['observed'] >= self.min_samples and (
+                    s['delay'] is None or s['observed'] % REFRESH == 0):
+                s['delay'] = percentile(sorted(s['times']), self.pct)
+
+    def count(self, route, hedged, won):
+        with self.lock:
+            s = self._route(route)
+            s['requests'] += 1
+            s['hedged'] += int(hedged)
+            s['won'] += int(won)
+
+    def run(self, route, send):
+        # send() makes the request; returns the first response, raises only
+        # when every request sent failed
+        delay = self.delay(route)
+        start = time.time()
+        if delay is None:
+            r = send()
+            self.observe(route, time.time() - start)
+            self.count(route, False, False)
+            return r
+        results = Queue()
+
+        def call(backup):
+            try:
+                r, error = send(), None
+            except Exception:
+                r, error = None, sys.exc_info()[1]
+            if not backup:
+                self.observe(route, time.time() - start)
+            results.put((backup, r, error))
+        threading.Thread(target=call, args=(False,)).start()
+        sent = 1
+        try:
+            backup, r, error = results.get(timeout=delay)
+        except Empty:
+            threading.Thread(target=call, args=(True,)).start()
+            sent = 2
+            backup, r, error = results.get()
+        # a failure only counts when the other request failed as well
+        if error is not None and sent == 2:
+            backup, r, error = results.get()
+        self.count(route, sent == 2, backup)
+        if error is not None:
+            raise error
+        return r
+
+    def dump(self):
+        with self.lock:
+            return [[route, s['requests'], s['hedged'], s['won'], s['delay']]
+                    for route, s in self.stats.items()]
+
+    def merge(self, rows):
+        with self.lock:
+            for route, requests, hedged, won, delay in rows:
+                s = self._route(route)
+                s['requests'] += requests
+                s['hedged'] += hedged
+                s['won'] += won
+                s['delay'] = max(s['delay'], delay) if s['delay'] is not None else delay
+
+    def report(self):
+        with self.lock:
+            rows = sorted((route, s['requests'], s['hedged'], s['won'], s['delay'])
+                          for route, s in self.stats.items() if s['hedged'])
+        if not rows:
+            return []
+        lines = ['%-44s %8s %7s %7s %8s %9s' % ('route', 'requests', 'hedged', 'won',
+                                                'won %', 'delay ms')]
+        for route, requests, hedged, won, delay in rows:
+            lines.append('%-44s %8d %7d %7d %7.0f%% %9.1f' % (
+                         route[0:44], requests, hedged, won, 100.0 * won / hedged,
+                         (delay or 0) * 1000))
+        return lines
+
+
+hedger = None
+if config.HEDGE:
+    hedger = Hedger(config.HEDGE_ROUTES, pct=config.HEDGE_PERCENTILE,
+                    min_samples=config.HEDGE_MIN_SAMPLES)
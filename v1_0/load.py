@@ -0,0 +1,240 @@
+# Load generation from the existing test scenarios: the assertions are the
+# definition of a correct response, so every iteration of a scenario is also
+# a check. Scenarios are weighted and run by a pool of threads (optionally in
+# several processes) for a fixed duration, either as fast as the concurrency
+# allows or at a target rate of scenario iterations per second.
+#
+#   python -m v1_0.load --duration 60 --concurrency 8 --rate 20 metrics=3 word_cloud vault
+#
+# A scenario is one of the names in SCENARIOS or 'module:callable', e.g.
+# 'v1_0.api.graphics:GraphicsServiceTest.check_graphics'.
+
+import sys
+import json
+import time
+import random
+import argparse
+import importlib
+import threading
+import multiprocessing
+from unittest import TestCase
+from collections import OrderedDict
+
+from . import config
+from . import timing
+from .timing import percentile
+
+SCENARIOS = {
+    'metrics': 'v1_0.api.metrics:MetricsServiceTest.check_metrics',
+    'graphics': 'v1_0.api.graphics:GraphicsServiceTest.check_graphics',
+    'recommender': 'v1_0.api.recommender:RecommenderServiceTest.check_recommender',
+    'citation_helper': 'v1_0.api.citation_helper:CitationHelperServiceTest.check_citation_helper',
+    'word_cloud': 'v1_0.api.word_cloud:VisServiceTest.check_word_cloud',
+    'paper_network': 'v1_0.api.paper_network:PaperNetworkTest.check_paper_network',
+    'author_network': 'v1_0.api.author_network:AuthorNetworkTest.check_author_network',
+    'vault': 'v1_0.api.myads:check_vault_concurrently',
+    'biblib': 'v1_0.api.biblib:test_authenticated_user',
+}
+
+
+def resolve(spec):
+    # 'module:function' or 'module:TestCaseClass.method'
+    spec = SCENARIOS.get(spec, spec)
+    module, name = spec.split(':')
+    obj = importlib.import_module(module)
+    parts = name.split('.')
+    for part in parts[:-1]:
+        obj = getattr(obj, part)
+    if isinstance(obj, type) and issubclass(obj, TestCase):
+        return getattr(obj(parts[-1]), parts[-1])
+    return getattr(obj, parts[-1])
+
+
+def parse_workload(items):
+    # ['metrics=3', 'vault'] -> [('metrics', 3.0), ('vault', 1.0)]
+    workload = []
+    for item in items:
+        name, _, weight = item.partition('=')
+        workload.append((name, float(weight or 1)))
+    return workload
+
+
+class Stats(object):
+
+    def __init__(self):
+        self.times = []
+        self.failures = 0
+        self.errors = 0
+
+    def merge(self, other):
+        self.times.extend(other.times)
+        self.failures += other.failures
+        self.errors += other.errors
+
+    def summary(self, duration):
+        times = sorted(self.times)
+        count = len(times)
+        return OrderedDict([
+            ('iterations', count),
+            ('throughput', count / duration if duration else 0.0),
+            ('failures', self.failures),
+            ('errors', self.errors),
+            ('error_rate', float(self.failures + self.errors) / count if count else 0.0),
+            ('p50', percentile(times, 50)),
+            ('p95', percentile(times, 95)),
+            ('p99', percentile(times, 99)),
+        ])
+
+
+class LoadDriver(object):
+
+    def __init__(self, workload, concurrency=4, rate=None):
+        # workload is a list of (scenario, weight)
+        self.workload = [(name, resolve(name), weight) for name, weight in workload]
+        self.concurrency = concurrency
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.stats = OrderedDict((name, Stats()) for name, _, _ in self.workload)
+        self.next_slot = None
+        total = sum(w for _, _, w in self.workload)
+        self.cumulative = []
+        acc = 0.0
+        for name, func, weight in self.workload:
+            acc += weight / total
+            self.cumulative.append((acc, name, func))
+
+    def choose(self):
+        x = random.random()
+        for edge, name, func in self.cumulative:
+            if x <= edge:
+                return name, func
+        return self.cumulative[-1][1:]
+
+    def wait_for_slot(self, deadline):
+        # open loop pacing: iterations start at fixed intervals, shared by
+        # all threads, no matter how long the previous ones took
+        if not self.rate:
+            return True
+        with self.lock:
+            slot = self.next_slot
+            self.next_slot += 1.0 / self.rate
+        if slot >= deadline:
+            return False
+        delay = slot - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        return True
+
+    def worker(self, deadline):
+        while time.time() < deadline and self.wait_for_slot(deadline):
+            name, func = self.choose()
+            failure = error = False
+            start = time.time()
+            try:
+                func()
+            except AssertionError:
+                failure = True
+            except Exception:
+                error = True
+            elapsed = time.time() - start
+            with self.lock:
+                stats = self.stats[name]
+                stats.times.append(elapsed)
+                stats.failures += failure
+                stats.errors += error
+
+    def run(self, duration):
+        start = time.time()
+        self.next_slot = start
+        threads = [threading.Thread(target=self.worker, args=(start + duration,))
+                   for i in range(self.concurrency)]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        for t in threads:
+            t.join()
+        return time.time() - start
+
+
+def resize_pools(size):
+    # every thread needs its own keep-alive connection
+    from .user_roles import anonymous_user, authenticated_user, bumblebee_user
+    if size > config.POOL_MAXSIZE:
+        for user in (anonymous_user, authenticated_user, bumblebee_user):
+            user.session = user.create_session(pool_maxsize=size)
+
+
+def run_process(args):
+    workload, concurrency, rate, duration = args
+    resize_pools(concurrency)
+    driver = LoadDriver(workload, concurrency=concurrency, rate=rate)
+    elapsed = driver.run(duration)
+    requests = sum(len(v) for v in timing.recorder.samples.values())
+    return elapsed, requests, dict((name, s.__dict__) for name, s in driver.stats.items())
+
+
+def run(workload, duration, concurrency=4, rate=None, processes=1):
+    # returns (elapsed, http requests, {scenario: Stats})
+    args = (workload, concurrency, rate and float(rate) / processes, duration)
+    if processes > 1:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(run_process, [args] * processes)
+        finally:
+            pool.close()
+    else:
+        results = [run_process(args)]
+    stats = OrderedDict((name, Stats()) for name, _ in workload)
+    for _, _, part in results:
+        for name, values in part.items():
+            s = Stats()
+            s.__dict__.update(values)
+            stats[name].merge(s)
+    return max(r[0] for r in results), sum(r[1] for r in results), stats
+
+
+def report(elapsed, requests, stats):
+    lines = ['%-16s %8s %8s %6s %6s %7s %9s %9s %9s' % (
+             'scenario', 'iters', 'iter/s', 'fail', 'err', 'err %', 'p50 ms', 'p95 ms', 'p99 ms')]
+    for name, s in stats.items():
+        s = s.summary(elapsed)
+        if not s['iterations']:
+            lines.append('%-16s %8d' % (name, 0))
+            continue
+        lines.append('%-16s %8d %8.2f %6d %6d %7.2f %9.1f %9.1f %9.1f' % (
+                     name, s['iterations'], s['throughput'], s['failures'], s['errors'],
+                     100 * s['error_rate'], s['p50'] * 1000, s['p95'] * 1000, s['p99'] * 1000))
+    lines.append('%d http requests in %.1fs (%.1f req/s)' % (requests, elapsed, requests / elapsed))
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the test scenarios as a load test')
+    parser.add_argument('scenarios', nargs='+',
+                        help='scenario[=weight], names: %s' % ', '.join(sorted(SCENARIOS)))
+    parser.add_argument('--duration', type=float, default=60, help='seconds')
+    parser.add_argument('--concurrency', type=int, default=4, help='threads per process')
+    parser.add_argument('--rate', type=float, help='target scenario iterations per second')
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args(argv)
+
+    workload = parse_workload(args.scenarios)
+    elapsed, requests, stats = run(workload, args.duration, concurrency=args.concurrency,
+                                   rate=args.rate, processes=args.processes)
+    for line in report(elapsed, requests, stats):
+        print(line)
+    if args.processes == 1:
+        for line in timing.recorder.report():
+            print(line)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'api_url': config.API_URL, 'duration': elapsed, 'requests': requests,
+                       'scenarios': dict((n, s.summary(elapsed)) for n, s in stats.items())},
+                      f, indent=2)
+    failed = sum(s.failures + s.errors for s in stats.values())
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,187 @@
+# The role matrix: a scenario is written once, as a check that takes the
+# user role, and run for the anonymous, authenticated and bumblebee roles at
+# the same time, one thread each. The anonymous role has to be refused (the
+# check fails and every request it made got a 401), the others have to pass;
+# the assertion names every role that didn't. The requests of every role are
+# kept side by side, so that a role that gets other statuses or is much
+# slower than the rest shows up in one table in the 'role matrix' summary:
+#
+#   test_roles = matrix.roles_test('graphics', GraphicsServiceTest, 'check_graphics')
+
+import time
+import threading
+import traceback
+from collections import OrderedDict
+
+from . import timing
+from .timing import percentile
+
+# every scenario run by this process, for the summary
+results = []
+
+# slower than this many times the fastest role, and by at least SLOWER_BY
+# seconds, is flagged
+SLOWER = 2.0
+SLOWER_BY = 0.005
+
+
+ROLES = ('anonymous', 'authenticated', 'bumblebee')
+
+
+def default_roles():
+    from .user_roles import anonymous_user, authenticated_user, bumblebee_user
+    return list(zip(ROLES, [anonymous_user, authenticated_user, bumblebee_user]))
+
+
+class RoleResult(object):
+
+    def __init__(self, role, refused=False):
+        self.role = role
+        self.refused = refused
+        self.error = None
+        self.elapsed = None
+        self.requests = []
+
+    @property
+    def passed(self):
+        if self.refused:
+            return bool(self.requests) and all(r[2] == 401 for r in self.requests)
+        return self.error is None
+
+    def outcome(self):
+        if self.refused:
+            return 'refused' if self.passed else 'not refused'
+        return 'passed' if self.passed else 'failed'
+
+    def routes(self):
+        # {'METHOD route': [statuses, sorted seconds]}
+        out = OrderedDict()
+        for method, route, status, elapsed in self.requests:
+            entry = out.setdefault('%s %s' % (method, route), [set(), []])
+            entry[0].add(status)
+            entry[1].append(elapsed)
+        for entry in out.values():
+            entry[1].sort()
+        return out
+
+
+class ScenarioResult(object):
+
+    def __init__(self, name, roles):
+        self.name = name
+        self.roles = roles
+
+    @property
+    def passed(self):
+        return all(r.passed for r in self.roles)
+
+    def failures(self):
+        out = []
+        for r in self.roles:
+            if r.passed:
+                continue
+            if r.refused:
+                statuses = sorted(set(s[2] for s in r.requests))
+                out.append('%s: expected only 401s, got %s' % (r.role, statuses or 'no requests'))
+            else:
+                out.append('%s: %s' % (r.role, r.error))
+        return out
+
+    def dump(self):
+        return [self.name, [[r.role, r.refused, r.error, r.elapsed, [list(s) for s in r.requests]]
+                            for r in self.roles]]
+
+    @classmethod
+    def load(cls, data):
+        name, roles = data
+        out = []
+        for role, refused, error, elapsed, requests in roles:
+            r = RoleResult(role, refused)
+            r.error, r.elapsed, r.requests = error, elapsed, [tuple(s) for s in requests]
+            out.append(r)
+        return cls(name, out)
+
+    def report(self):
+        # a row per endpoint: requests x p50 ms and the statuses per role;
+        # ! marks statuses that differ between the roles that passed, or a
+        # p50 too much slower than the fastest
+        width = 26
+        cell = '%%-%ds' % width
+        lines = [('%-40s' % self.name[0:40]) + ''.join(cell % r.role for r in self.roles)]
+        lines.append(('%-40s' % 'outcome') + ''.join(cell % r.outcome() for r in self.roles))
+        lines.append(('%-40s' % 'wall ms') + ''.join(
+            cell % ('%.1f' % (r.elapsed * 1000) if r.elapsed is not None else '-')
+            for r in self.roles))
+        routes = [r.routes() for r in self.roles]
+        names = []
+        for rs in routes:
+            names.extend(n for n in rs if n not in names)
+        for name in names:
+            cells = []
+            compared = [rs[name] for r, rs in zip(self.roles, routes) if name in rs and not r.refused]
+            statuses = set(tuple(sorted(e[0])) for e in compared)
+            fastest = min([percentile(e[1], 50) for e in compared] or [None])
+            for r, rs in zip(self.roles, routes):
+                if name not in rs:
+                    cells.append(cell % '-')
+                    continue
+                codes, times = rs[name]
+                p50 = percentile(times, 50)
+                flag = not r.refused and (len(statuses) > 1 or (
+                    p50 > SLOWER * fastest and p50 - fastest > SLOWER_BY))
+                cells.append(cell % ('%dx %.1f ms %s%s' % (len(times), p50 * 1000,
+                                                         ','.join(str(c) for c in sorted(codes)),
+                                                         ' !' if flag else '')))
+            lines.append(('%-40s' % name[0:40]) + ''.join(cells))
+        return lines
+
+
+def run(name, check, roles=None, refused=('anonymous',)):
+    # runs check(user) for every (role, user) at once, a role can also be
+    # one of ROLES; fails with every role that didn't do what it should
+    users = dict(default_roles())
+    roles = [r if isinstance(r, tuple) else (r, users[r]) for r in roles or ROLES]
+    out = [RoleResult(role, role in refused) for role, user in roles]
+    gate = threading.Event()
+
+    def call(result, user):
+        gate.wait()
+        with timing.capture() as samples:
+            start = time.time()
+            try:
+                check(user)
+            except Exception:
+                result.error = traceback.format_exc()
+            result.elapsed = time.time() - start
+        result.requests = samples
+    threads = [threading.Thread(target=call, args=(result, user))
+               for result, (role, user) in zip(out, roles)]
+    for t in threads:
+        t.start()
+    gate.set()
+    for t in threads:
+        t.join()
+    scenario = ScenarioResult(name, out)
+    results.append(scenario)
+    assert scenario.passed, '%s:\n%s' % (name, '\n'.join(scenario.failures()))
+    return scenario
+
+
+def roles_test(name, case, method, **kwargs):
+    # a test function that runs the check method of a TestCase class as the
+    # scenario, for all roles at once
+    def test_roles():
+        run(name, getattr(case(method), method), **kwargs)
+    return test_roles
+
+
+def merged(scenarios):
+    # one result per scenario name, with the roles of all its runs in the
+    # order of ROLES (the runs finish in any order on parallel workers)
+    out = OrderedDict()
+    for scenario in scenarios:
+        out.setdefault(scenario.name, ScenarioResult(scenario.name, [])).roles.extend(scenario.roles)
+    order = lambda r: ROLES.index(r.role) if r.role in ROLES else len(ROLES)
+    for scenario in out.values():
+        scenario.roles.sort(key=order)
+    return list(out.values())
@@ -0,0 +1,112 @@
+# One pass over the works of an orcid profile, indexed by the client that
+# added them (source-client-id.path), by external identifier (type, value)
+# and by visibility, so that many lookups and diffs don't rescan the
+# profile:
+#
+#   index = ProfileIndex.from_profile(r.json())
+#   index.source(config.ORCID_CLIENT_ID)
+#   index.find('BIBCODE', '2016APh....72...11W')
+#   missing, extra = index.diff(bibcodes, client_id=config.ORCID_CLIENT_ID)
+#
+# Very large profiles can be read with from_stream, which never holds the
+# whole document when ijson is installed
+
+import json
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+WORKS_PATH = ['orcid-profile', 'orcid-activities', 'orcid-works', 'orcid-work']
+
+
+def _get(value, *keys):
+    # value[k1][k2]..., None where anything on the way is missing or null
+    for key in keys:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def identifier(kind, value):
+    # dois are case insensitive, bibcodes are not
+    kind = (kind or '').upper()
+    value = (value or '').strip()
+    if kind == 'DOI':
+        value = value.lower()
+    return kind, value
+
+
+def work_identifiers(work):
+    ids = _get(work, 'work-external-identifiers', 'work-external-identifier') or []
+    return [identifier(i.get('work-external-identifier-type'),
+                       _get(i, 'work-external-identifier-id', 'value')) for i in ids]
+
+
+class ProfileIndex(object):
+
+    def __init__(self, works=()):
+        self.works = []
+        self.by_source = {}
+        self.by_identifier = {}
+        self.by_visibility = {}
+        for work in works:
+            self.add(work)
+
+    @classmethod
+    def from_profile(cls, data):
+        return cls(_get(data, *WORKS_PATH) or [])
+
+    @classmethod
+    def from_stream(cls, f):
+        # f is a file (or a raw response) with a profile as json
+        if ijson is None:
+            return cls.from_profile(json.load(f))
+        return cls(ijson.items(f, '.'.join(WORKS_PATH + ['item'])))
+
+    def add(self, work):
+        position = len(self.works)
+        self.works.append(work)
+        self.by_source.setdefault(_get(work, 'source', 'source-client-id', 'path'), []).append(position)
+        self.by_visibility.setdefault(work.get('visibility'), []).append(position)
+        for key in set(work_identifiers(work)):
+            self.by_identifier.setdefault(key, []).append(position)
+
+    def __len__(self):
+        return len(self.works)
+
+    def source(self, client_id):
+        return [self.works[i] for i in self.by_source.get(client_id, [])]
+
+    def visibility(self, visibility):
+        return [self.works[i] for i in self.by_visibility.get(visibility, [])]
+
+    def find(self, kind, value):
+        return [self.works[i] for i in self.by_identifier.get(identifier(kind, value), [])]
+
+    def identifiers(self, kind='BIBCODE', client_id=None):
+        # the values of one kind of identifier, of the works of one client
+        kind = kind.upper()
+        allowed = set(self.by_source.get(client_id, [])) if client_id is not None else None
+        return set(value for (k, value), positions in self.by_identifier.items()
+                   if k == kind and (allowed is None or allowed.intersection(positions)))
+
+    def duplicates(self, kind='BIBCODE', client_id=None):
+        # {value: number of works} for identifiers on more than one work
+        allowed = set(self.by_source.get(client_id, [])) if client_id is not None else None
+        out = {}
+        for (k, value), positions in self.by_identifier.items():
+            if k == kind.upper():
+                n = len(positions) if allowed is None else len(allowed.intersection(positions))
+                if n > 1:
+                    out[value] = n
+        return out
+
+    def diff(self, expected, kind='BIBCODE', client_id=None):
+        # (missing, extra): the expected identifiers without a work and the
+        # works' identifiers that weren't expected
+        expected = set(identifier(kind, value)[1] for value in expected)
+        present = self.identifiers(kind, client_id)
+        return expected - present, present - expected
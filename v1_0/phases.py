@@ -0,0 +1,247 @@
+# Where the time of a request goes: with PHASE_TIMING the user roles send
+# through a PhaseAdapter, which times every request in phases
+#
+#   dns       resolving the host name       (0 on a reused connection)
+#   connect   the tcp handshake             (0 on a reused connection)
+#   tls       the tls handshake             (0 on a reused or http connection)
+#   ttfb      sending the request up to the response headers, i.e. the
+#             gateway and the service
+#   download  reading the body
+#   decode    decoding the json body (decoded right away in this mode)
+#
+# and hands the sample, a dict with these keys and method, route, status and
+# reused, to every registered sink. A sink is any callable:
+#
+#   phases.add_sink(lambda sample: ...)
+#   phases.add_sink(phases.CsvSink('phases.csv'))
+
+import os
+import csv
+import time
+import socket
+import logging
+import threading
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from . import config
+from .timing import percentile
+
+PHASES = ['dns', 'connect', 'tls', 'ttfb', 'download', 'decode']
+FIELDS = ['method', 'route', 'status', 'reused'] + PHASES
+
+sinks = []
+
+# the phases of the request the current thread is sending
+_current = threading.local()
+
+
+def add_sink(sink):
+    sinks.append(sink)
+    return sink
+
+
+def remove_sink(sink):
+    sinks.remove(sink)
+
+
+def emit(sample):
+    for sink in list(sinks):
+        sink(sample)
+
+
+def _note(phase, seconds):
+    phases = getattr(_current, 'phases', None)
+    if phases is not None:
+        phases[phase] = phases.get(phase, 0.0) + seconds
+
+
+class TimedConnectionMixin(object):
+
+    def _new_conn(self):
+        # resolves the name itself to time it apart from the connect; only
+        # the first address is tried
+        start = time.time()
+        dns_host = getattr(self, '_dns_host', None)
+        if dns_host is not None:
+            try:
+                self._dns_host = socket.getaddrinfo(dns_host, self.port, 0,
+                                                    socket.SOCK_STREAM)[0][4][0]
+            except socket.gaierror:
+                pass  # the connect reports it
+        resolved = time.time()
+        try:
+            return super(TimedConnectionMixin, self)._new_conn()
+        finally:
+            if dns_host is not None:
+                self._dns_host = dns_host
+            _note('dns', resolved - start)
+            _note('connect', time.time() - resolved)
+
+    def connect(self):
+        # whatever a connect takes beyond _new_conn is the tls handshake
+        phases = getattr(_current, 'phases', None)
+        before = phases.get('dns', 0.0) + phases.get('connect', 0.0) if phases is not None else 0.0
+        start = time.time()
+        super(TimedConnectionMixin, self).connect()
+        if phases is not None:
+            opened = phases.get('dns', 0.0) + phases.get('connect', 0.0) - before
+            if isinstance(self, HTTPSConnection):
+                phases['tls'] = max(time.time() - start - opened, 0.0)
+            phases['reused'] = False
+
+
+class TimedHTTPConnection(TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class PhaseAdapter(HTTPAdapter):
+
+    def init_poolmanager(self, *args, **kwargs):
+        HTTPAdapter.init_poolmanager(self, *args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': TimedHTTPConnectionPool,
+                                                   'https': TimedHTTPSConnectionPool}
+
+    def send(self, request, stream=False, **kwargs):
+        _current.phases = phases = {'reused': True}
+        start = time.time()
+        try:
+            response = HTTPAdapter.send(self, request, stream=stream, **kwargs)
+            headers = time.time()
+            if not stream:
+                response.content
+        finally:
+            _current.phases = None
+        for phase in ('dns', 'connect', 'tls'):
+            phases.setdefault(phase, 0.0)
+        phases['ttfb'] = headers - start - phases['dns'] - phases['connect'] - phases['tls']
+        phases['download'] = time.time() - headers
+        response.phases = phases
+        return response
+
+
+def observe(response):
+    # called by the user roles with every response; only the ones that came
+    # through a PhaseAdapter have phases
+    phases = getattr(response.response, 'phases', None)
+    if phases is None or not sinks:
+        return
+    decode = None
+    if 'json' in (response.headers.get('content-type') or ''):
+        try:
+            response.json()
+            decode = response.decode_time
+        except ValueError:
+            pass
+    sample = dict(phases, method=response.method, route=response.route,
+                  status=response.status_code, decode=decode)
+    emit(sample)
+
+
+class LogSink(object):
+
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or logging.getLogger('adsrex.phases')
+        self.level = level
+
+    def __call__(self, sample):
+        self.logger.log(self.level, '%s %s %s%s %s', sample['method'], sample['route'],
+                        sample['status'], ' (reused)' if sample['reused'] else '',
+                        ' '.join('%s=%.1fms' % (p, sample[p] * 1000)
+                                 for p in PHASES if sample[p] is not None))
+
+
+class CsvSink(object):
+    # one row per request (seconds), the file is opened on the first one;
+    # under xdist every worker writes its own file, phases-gw0.csv, ...
+
+    def __init__(self, path):
+        worker = os.environ.get('PYTEST_XDIST_WORKER')
+        if worker:
+            root, ext = os.path.splitext(path)
+            path = '%s-%s%s' % (root, worker, ext)
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = None
+
+    def __call__(self, sample):
+        with self.lock:
+            if self.file is None:
+                new = not os.path.exists(self.path) or not os.path.getsize(self.path)
+                self.file = open(self.path, 'a')
+                self.writer = csv.writer(self.file)
+                if new:
+                    self.writer.writerow(['time'] + FIELDS)
+            self.writer.writerow(['%.3f' % time.time()] + [sample[f] for f in FIELDS])
+            self.file.flush()
+
+
+class Aggregator(object):
+    # keeps every phase of every request per endpoint, for the summary
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def __call__(self, sample):
+        with self.lock:
+            s = self.samples.setdefault((sample['method'], sample['route']),
+                                        dict((p, []) for p in PHASES + ['reused']))
+            for p in PHASES:
+                if sample[p] is not None:
+                    s[p].append(sample[p])
+            s['reused'].append(int(sample['reused']))
+
+    def dump(self):
+        with self.lock:
+            return [[method, route, dict((k, list(v)) for k, v in s.items())]
+                    for (method, route), s in self.samples.items()]
+
+    def merge(self, samples):
+        with self.lock:
+            for method, route, values in samples:
+                s = self.samples.setdefault((method, route),
+                                            dict((p, []) for p in PHASES + ['reused']))
+                for k, v in values.items():
+                    s[k].extend(v)
+
+    def report(self):
+        # p50 of every phase per endpoint, in milliseconds
+        with self.lock:
+            items = sorted(self.samples.items(), key=lambda x: (x[0][1], x[0][0]))
+            items = [(key, dict((k, sorted(v)) for k, v in s.items())) for key, s in items]
+        if not items:
+            return []
+        lines = ['%-44s %6s %7s' % ('endpoint (p50 ms)', 'count', 'reused') +
+                 ''.join(' %8s' % p for p in PHASES)]
+        for (method, route), s in items:
+            count = len(s['reused'])
+            cells = ''.join(' %8.2f' % (percentile(s[p], 50) * 1000) if s[p] else ' %8s' % '-'
+                            for p in PHASES)
+            lines.append('%-44s %6d %6.0f%%' % (('%s %s' % (method, route))[0:44], count,
+                                                100.0 * sum(s['reused']) / count) + cells)
+        return lines
+
+
+aggregator = Aggregator()
+
+if config.PHASE_TIMING:
+    add_sink(aggregator)
+    if config.PHASE_LOG:
+        add_sink(LogSink())
+    if config.PHASE_CSV:
+        add_sink(CsvSink(config.PHASE_CSV))
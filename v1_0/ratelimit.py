@@ -0,0 +1,111 @@
+import os
+import json
+import time
+import fcntl
+import hashlib
+import contextlib
+
+from .token_store import private_dir, write_private
+
+
+class RateLimitExhausted(Exception):
+    pass
+
+
+class Scheduler(object):
+    # Keeps the x-ratelimit-* budget of every access token in a json file
+    # shared by all test processes, {key: [remaining, reset, next_slot]}, and
+    # paces requests before the API starts answering with 429s.
+
+    def __init__(self, path, reserve=10, pace_below=200, retries=1, max_wait=300):
+        self.path = path
+        self.reserve = reserve
+        self.pace_below = pace_below
+        self.retries = retries
+        self.max_wait = max_wait
+
+    def key(self, api_url, token):
+        return hashlib.sha1(('%s %s' % (api_url, token)).encode('utf-8')).hexdigest()
+
+    @contextlib.contextmanager
+    def locked(self):
+        private_dir(self.path)
+        fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _write(self, data):
+        write_private(self.path, data)
+
+    def wait(self, seconds):
+        if seconds <= 0:
+            return
+        if seconds > self.max_wait:
+            raise RateLimitExhausted('Rate limit budget spent, it resets in %ds' % seconds)
+        time.sleep(seconds)
+
+    def before(self, key):
+        # called before every request with a token
+        state = self._read().get(key)
+        if not state:
+            return
+        remaining, reset, _ = state
+        now = time.time()
+        if now >= reset or remaining > self.pace_below:
+            return
+        if remaining <= self.reserve:
+            return self.wait(reset - now)
+        # spread what is left evenly until the reset; the slots are handed
+        # out through the shared file so all processes pace together. While
+        # there is budget left no request waits longer than max_wait, even
+        # when that spends it before the reset (a daily window)
+        with self.locked():
+            data = self._read()
+            remaining, reset, next_slot = data[key]
+            interval = min((reset - now) / max(remaining - self.reserve, 1), self.max_wait)
+            slot = min(max(now, next_slot), now + self.max_wait)
+            data[key] = [remaining, reset, slot + interval]
+            self._write(data)
+        self.wait(slot - now)
+
+    def after(self, key, response):
+        # records the budget the API reported; returns the seconds to wait
+        # before a retry when the response was a 429, None otherwise
+        headers = response.headers
+        try:
+            remaining = int(headers['x-ratelimit-remaining'])
+            reset = float(headers['x-ratelimit-reset'])
+        except (KeyError, ValueError):
+            return None
+        # far from the limit only a new rate window matters (before() doesn't
+        # pace then), so most responses don't touch the file
+        old = self._read().get(key)
+        if response.status_code != 429 and old and old[1] == reset and \
+                remaining > self.pace_below and old[0] > self.pace_below:
+            return None
+        with self.locked():
+            data = self._read()
+            old = data.get(key)
+            next_slot = 0
+            # responses of concurrent processes arrive out of order; within
+            # a rate window the budget only goes down
+            if old and old[1] == reset:
+                remaining = min(remaining, old[0])
+                next_slot = old[2]
+            data[key] = [remaining, reset, next_slot]
+            self._write(data)
+        if response.status_code == 429:
+            retry = headers.get('retry-after')
+            return float(retry) if retry and retry.isdigit() else max(reset - time.time(), 0)
+        return None
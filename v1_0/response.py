@@ -0,0 +1,58 @@
+import sys
+import time
+from . import timing
+
+# an optional faster decoder for every body; on python 2 they return str
+# where json gives unicode, so there it is always json
+fast_json = None
+if sys.version_info[0] >= 3:
+    try:
+        import orjson as fast_json
+    except ImportError:
+        try:
+            import ujson as fast_json
+        except ImportError:
+            pass
+
+
+_missing = object()
+
+
+class Response(object):
+    # Wraps the requests response of a user role. json() decodes the body
+    # once (with the faster decoder when there is one) and hands out the
+    # same object afterwards, the tests call it over and over on large
+    # payloads: it is shared, copy it before changing it. The time the
+    # decoding took is in decode_time and goes to the timing recorder.
+    # Everything else is the requests response.
+
+    def __init__(self, response, method=None, route=None):
+        self.response = response
+        self.method = method
+        self.route = route
+        self.decode_time = None
+        self._json = _missing
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+    def __bool__(self):
+        return bool(self.response)
+    __nonzero__ = __bool__
+
+    def __repr__(self):
+        return repr(self.response)
+
+    def json(self, **kwargs):
+        if kwargs:
+            return self.response.json(**kwargs)
+        if self._json is _missing:
+            start = time.time()
+            if fast_json is None:
+                self._json = self.response.json()
+            else:
+                self._json = fast_json.loads(self.response.content)
+            self.decode_time = time.time() - start
+            if self.route is not None:
+                timing.recorder.record_decode(self.method, self.route, self.decode_time)
+        return self._json
@@ -0,0 +1,177 @@
+# Declarative response shapes. A schema is written with plain literals and
+# compiled once into a validator that checks a whole response in one pass
+# and reports every mismatch, not just the first one:
+#
+#   {'a': int, 'b': [dict]}   a dict with exactly the keys a and b, a is an
+#                             int, b a list of dicts
+#   Contains({'a': int})      a dict with at least the key a
+#   Values({'x': ANY})        a dict with any keys, every value is {'x': ...}
+#   List(str, min_length=1)   a non-empty list of strings ([str] allows empty)
+#   Equal(value)              exactly this value
+#   Predicate(func, 'what')   func(value) is true
+#   ANY                       anything
+#
+#   validator = compile({'bibcode': Equal(bibcode), 'figures': [dict]})
+#   validator.validate(r.json())   # raises SchemaError, an AssertionError
+#   validator.errors(r.json())     # [] or ['$.figures[0]: expected dict, got list', ...]
+
+class SchemaError(AssertionError):
+    pass
+
+
+class Contains(object):
+    def __init__(self, fields):
+        self.fields = fields
+
+
+class Values(object):
+    def __init__(self, schema):
+        self.schema = schema
+
+
+class List(object):
+    def __init__(self, schema, min_length=0):
+        self.schema = schema
+        self.min_length = min_length
+
+
+class Equal(object):
+    def __init__(self, value):
+        self.value = value
+
+
+class Predicate(object):
+    def __init__(self, func, description):
+        self.func = func
+        self.description = description
+
+
+ANY = Predicate(lambda value: True, 'anything')
+
+
+def _type_name(t):
+    if isinstance(t, tuple):
+        return ' or '.join(x.__name__ for x in t)
+    return t.__name__
+
+
+def _path(path):
+    # paths are kept as (parent, key) pairs and only spelled out on failure
+    keys = []
+    while isinstance(path, tuple):
+        path, key = path
+        keys.append('[%d]' % key if isinstance(key, int) else '.%s' % key)
+    return path + ''.join(reversed(keys))
+
+
+def _compile(schema):
+    # returns check(value, path, errors)
+    if isinstance(schema, dict):
+        return _compile_object(schema, exact=True)
+    if isinstance(schema, Contains):
+        return _compile_object(schema.fields, exact=False)
+    if isinstance(schema, list):
+        return _compile_list(List(schema[0]))
+    if isinstance(schema, List):
+        return _compile_list(schema)
+    if isinstance(schema, Values):
+        check_value = _compile(schema.schema)
+
+        def check(value, path, errors):
+            if not isinstance(value, dict):
+                errors.append('%s: expected dict, got %s' % (_path(path), type(value).__name__))
+                return
+            for key, item in value.items():
+                check_value(item, (path, key), errors)
+        return check
+    if isinstance(schema, Equal):
+        expected = schema.value
+
+        def check(value, path, errors):
+            if value != expected:
+                errors.append('%s: expected %r, got %r' % (_path(path), expected, value))
+        return check
+    if isinstance(schema, Predicate):
+        if schema is ANY:
+            return lambda value, path, errors: None
+        func, description = schema.func, schema.description
+
+        def check(value, path, errors):
+            if not func(value):
+                errors.append('%s: expected %s, got %r' % (_path(path), description, value))
+        return check
+    if isinstance(schema, (type, tuple)):
+        name = _type_name(schema)
+
+        def check(value, path, errors):
+            if not isinstance(value, schema):
+                errors.append('%s: expected %s, got %s' % (_path(path), name, type(value).__name__))
+        return check
+    raise TypeError('Not a schema: %r' % (schema,))
+
+
+def _compile_object(fields, exact):
+    checks = [(key, _compile(sub)) for key, sub in fields.items() if sub is not ANY]
+    required = frozenset(fields)
+
+    def check(value, path, errors):
+        if not isinstance(value, dict):
+            errors.append('%s: expected dict, got %s' % (_path(path), type(value).__name__))
+            return
+        if exact and len(value) != len(required) or not required.issubset(value):
+            keys = set(value)
+            missing = sorted(required - keys)
+            if missing:
+                errors.append('%s: missing keys %s' % (_path(path), missing))
+            if exact and keys - required:
+                errors.append('%s: unexpected keys %s' % (_path(path), sorted(keys - required)))
+        for key, sub in checks:
+            if key in value:
+                sub(value[key], (path, key), errors)
+    return check
+
+
+def _compile_list(schema):
+    check_item = None if schema.schema is ANY else _compile(schema.schema)
+    min_length = schema.min_length
+
+    def check(value, path, errors):
+        if not isinstance(value, list):
+            errors.append('%s: expected list, got %s' % (_path(path), type(value).__name__))
+            return
+        if len(value) < min_length:
+            errors.append('%s: expected at least %d items, got %d' % (
+                          _path(path), min_length, len(value)))
+        if check_item is not None:
+            for i, item in enumerate(value):
+                check_item(item, (path, i), errors)
+    return check
+
+
+class Validator(object):
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.check = _compile(schema)
+
+    def errors(self, value):
+        errors = []
+        self.check(value, '$', errors)
+        return errors
+
+    def validate(self, value):
+        errors = self.errors(value)
+        if errors:
+            raise SchemaError('%d mismatches:\n  %s' % (len(errors), '\n  '.join(errors)))
+        return value
+
+    __call__ = validate
+
+
+def compile(schema):
+    return Validator(schema)
+
+
+def keys(names, schema=ANY):
+    # {name: schema} for all names, for objects whose values aren't checked
+    return dict((name, schema) for name in names)
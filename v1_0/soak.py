@@ -0,0 +1,198 @@
+# Endurance runs: the load driver runs the scenarios with a steady
+# concurrency for hours, and every interval a sample is taken of the
+# iterations, their latency percentiles and errors, the keep-alive reuse and
+# the resident memory of this process. At the end a line is fitted through
+# every series (after a warm-up) and drift is flagged: latency creeping up,
+# memory growing, errors becoming more frequent or coming in bursts.
+#
+#   python -m v1_0.soak --duration 4h --interval 60 --concurrency 8 metrics=3 word_cloud vault
+
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import threading
+from collections import OrderedDict
+
+from . import config
+from . import timing
+from . import load
+from .timing import percentile
+
+# smaller growth of the resident size over a whole run is allocator noise
+RSS_NOISE_MB = 5.0
+
+
+def parse_duration(value):
+    # '90' seconds, '30m', '4h'
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    if value[-1:] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+
+def rss_kb():
+    # the current resident size; the peak where /proc is missing
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024.0
+    except (IOError, OSError, ValueError):
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / 1024.0 if sys.platform == 'darwin' else float(rss)
+
+
+def connections():
+    from .user_roles import anonymous_user, authenticated_user, bumblebee_user
+    total = {'requests': 0, 'connections': 0}
+    for user in (anonymous_user, authenticated_user, bumblebee_user):
+        stats = user.connection_stats()
+        for key in total:
+            total[key] += stats[key]
+    return total
+
+
+def linear_fit(xs, ys):
+    # least squares line, returns (intercept, slope)
+    n = float(len(xs))
+    mx, my = sum(xs) / n, sum(ys) / n
+    sxx = sum((x - mx) ** 2 for x in xs)
+    if not sxx:
+        return my, 0.0
+    slope = sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / sxx
+    return my - slope * mx, slope
+
+
+class Soak(object):
+
+    def __init__(self, workload, concurrency=4, rate=None, interval=None):
+        self.driver = load.LoadDriver(workload, concurrency=concurrency, rate=rate)
+        self.interval = interval or config.SOAK_INTERVAL
+        self.samples = []
+
+    def take_sample(self, start, last, previous):
+        # the driver's statistics and the http timings start over with every
+        # sample, hours of them would otherwise be a leak of their own
+        with self.driver.lock:
+            window = self.driver.stats
+            self.driver.stats = OrderedDict((name, load.Stats()) for name in window)
+        timing.recorder.reset()
+        times = sorted(t for s in window.values() for t in s.times)
+        errors = sum(s.failures + s.errors for s in window.values())
+        conns = connections()
+        requests = conns['requests'] - previous['requests']
+        opened = conns['connections'] - previous['connections']
+        now = time.time()
+        sample = OrderedDict([
+            ('t', now - start),
+            ('window', now - last),
+            ('iterations', len(times)),
+            ('errors', errors),
+            ('error_rate', float(errors) / len(times) if times else 0.0),
+            ('p50', percentile(times, 50)),
+            ('p95', percentile(times, 95)),
+            ('p99', percentile(times, 99)),
+            ('requests', requests),
+            ('reuse', float(max(requests - opened, 0)) / requests if requests else None),
+            ('rss_kb', rss_kb()),
+        ])
+        self.samples.append(sample)
+        return sample, conns
+
+    def run(self, duration, progress=None):
+        start = time.time()
+        runner = threading.Thread(target=self.driver.run, args=(duration,))
+        runner.daemon = True
+        previous = connections()
+        last = start
+        runner.start()
+        while runner.is_alive():
+            runner.join(self.interval)
+            sample, previous = self.take_sample(start, last, previous)
+            last = start + sample['t']
+            if progress:
+                progress(sample)
+        return self.samples
+
+    def drift(self, warmup=0.1):
+        # one line per flagged series; the first warmup fraction of the run
+        # (connections, caches, jit of the services) and the last, partial
+        # interval are left out
+        samples = [s for s in self.samples
+                   if s['iterations'] and s['window'] >= self.interval / 2.0]
+        samples = samples[int(len(samples) * warmup):]
+        flags = []
+        if len(samples) < 3:
+            return flags
+        ts = [s['t'] for s in samples]
+        span = ts[-1] - ts[0]
+        for key in ('p50', 'p95'):
+            a, b = linear_fit(ts, [s[key] for s in samples])
+            if a > 0 and b * span / a > config.SOAK_LATENCY_DRIFT:
+                flags.append('%s latency drifted from %.1f ms to %.1f ms (+%.0f%%)' % (
+                             key, a * 1000, (a + b * span) * 1000, 100 * b * span / a))
+        a, b = linear_fit(ts, [s['rss_kb'] / 1024.0 for s in samples])
+        if b * 3600 > config.SOAK_RSS_DRIFT and b * span > RSS_NOISE_MB:
+            flags.append('client memory grows by %.1f MB per hour (%.0f MB at the end)' % (
+                         b * 3600, samples[-1]['rss_kb'] / 1024.0))
+        a, b = linear_fit(ts, [s['error_rate'] for s in samples])
+        if b * span > config.SOAK_ERROR_DRIFT:
+            flags.append('error rate drifted from %.2f%% to %.2f%%' % (
+                         100 * a, 100 * (a + b * span)))
+        half = len(samples) // 2
+        bursts = [sum(1 for s in part if s['error_rate'] > config.SOAK_ERROR_BURST)
+                  for part in (samples[:half], samples[half:])]
+        if bursts[1] > bursts[0]:
+            flags.append('error bursts (> %.0f%%) in %d intervals of the second half, %d of the first' % (
+                         100 * config.SOAK_ERROR_BURST, bursts[1], bursts[0]))
+        return flags
+
+
+def format_sample(s):
+    def ms(value):
+        return '%8.1f' % (value * 1000) if value is not None else '%8s' % '-'
+    return '%8.0f %7d %6d %6.2f %s %s %s %6s %9.1f' % (
+           s['t'], s['iterations'], s['errors'], 100 * s['error_rate'], ms(s['p50']),
+           ms(s['p95']), ms(s['p99']),
+           '%.0f%%' % (100 * s['reuse']) if s['reuse'] is not None else '-', s['rss_kb'] / 1024.0)
+
+
+HEADER = '%8s %7s %6s %6s %8s %8s %8s %6s %9s' % (
+         't (s)', 'iters', 'err', 'err %', 'p50 ms', 'p95 ms', 'p99 ms', 'reuse', 'rss MB')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the test scenarios for hours and watch for drift')
+    parser.add_argument('scenarios', nargs='+',
+                        help='scenario[=weight], names: %s' % ', '.join(sorted(load.SCENARIOS)))
+    parser.add_argument('--duration', type=parse_duration, default=parse_duration('1h'),
+                        help='e.g. 3600, 90m, 4h')
+    parser.add_argument('--interval', type=parse_duration, default=config.SOAK_INTERVAL,
+                        help='seconds between samples')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--rate', type=float, help='target scenario iterations per second')
+    parser.add_argument('--json', help='write the time series to this file')
+    args = parser.parse_args(argv)
+
+    load.resize_pools(args.concurrency)
+    soak = Soak(load.parse_workload(args.scenarios), concurrency=args.concurrency,
+                rate=args.rate, interval=args.interval)
+    print(HEADER)
+
+    def progress(sample):
+        print(format_sample(sample))
+        sys.stdout.flush()
+    soak.run(args.duration, progress)
+    flags = soak.drift()
+    for line in flags or ['no drift']:
+        print(line)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'api_url': config.API_URL, 'samples': soak.samples, 'drift': flags},
+                      f, indent=2)
+    return 1 if flags else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,774 @@
+# A local stand-in for the ADS API. It implements the endpoints these tests
+# exercise, with responses shaped the way the assertions expect, so that the
+# suite (and the client side of load runs) can work on a machine without
+# network. Point API_URL at it:
+#
+#   python -m v1_0.standin --port 5000 --latency 0.05 --error-rate 0.01
+#   API_URL = 'http://localhost:5000/v1'
+#
+# Any non-empty bearer token is accepted as an authenticated user; requests
+# without one get a 401 wherever the real API would send one.
+
+import re
+import sys
+import gzip
+import json
+import time
+import random
+import hashlib
+import argparse
+import datetime
+import threading
+
+try:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+    from StringIO import StringIO as BytesIO
+except ImportError:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+    from io import BytesIO
+
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': 'https://ui.adsabs.harvard.edu',
+    'Access-Control-Allow-Headers': 'Accept, Authorization, Content-Type, '
+                                    'Orcid-Authorization, X-BB-Api-Client-Version',
+    'Access-Control-Allow-Methods': 'DELETE, GET, OPTIONS, POST, PUT',
+    'Access-Control-Allow-Credentials': 'true',
+}
+
+RESOURCES = {
+    'adsws.api': {'base': '/v1', 'endpoints': [
+        "/harbour/auth/twopointoh", "/harbour/auth/classic", "/harbour/mirrors",
+        "/harbour/version", "/objects/query", "/harbour/user", "/biblib/twopointoh",
+        "/search/resources", "/biblib/resources", "/biblib/libraries",
+        "/search/bigquery", "/biblib/classic", "/export/endnote", "/search/status",
+        "/export/bibtex", "/export/aastex", "/export/icarus", "/search/query",
+        "/search/qtree", "/export/mnras", "/search/tvrh", "/export/soph", "/export/ris",
+        "/orcid/exchangeOAuthCode", "/vault/configuration", "/oauth/authorize",
+        "/vault/user-data", "/oauth/invalid/", "/oauth/errors/", "/oauth/token",
+        "/vault/query", "/oauth/ping/", "/oauth/info/", "/vis/author-network",
+        "/vis/paper-network", "/vis/word-cloud", "/citation_helper/", "/protected",
+        "/metrics/", "/objects/", "/status",
+        "/harbour/libraries/twopointoh/<int:uid>", "/harbour/libraries/classic/<int:uid>",
+        "/harbour/export/twopointoh/<export>", "/objects/pos/<string:pstring>",
+        "/objects/<string:objects>/<string:source>",
+        "/biblib/permissions/<string:library>", "/biblib/documents/<string:library>",
+        "/biblib/libraries/<string:library>", "/biblib/transfer/<string:library>",
+        "/vault/execute_query/<queryid>", "/vault/configuration/<key>",
+        "/orcid/preferences/<orcid_id>", "/orcid/get-profile/<orcid_id>",
+        "/vault/query2svg/<queryid>", "/orcid/export/<iso_datestring>",
+        "/vault/query/<queryid>", "/orcid/<orcid_id>/orcid-profile",
+        "/orcid/<orcid_id>/orcid-works", "/recommender/<string:bibcode>",
+        "/graphics/<string:bibcode>", "/metrics/<string:bibcode>",
+        "/objects/<string:objects>", "/user/<string:identifier>"]},
+    'adsws.accounts': {'base': '/v1/accounts', 'endpoints': [
+        "/oauth/authorize", "/oauth/invalid/", "/oauth/errors/", "/oauth/token",
+        "/oauth/ping/", "/oauth/info/", "/user/delete", "/change-password",
+        "/change-email", "/bootstrap", "/protected", "/register", "/status",
+        "/logout", "/token", "/csrf", "/user", "/reset-password/<string:token>",
+        "/verify/<string:token>"]},
+    'adsws.feedback': {'base': '/v1/feedback', 'endpoints': [
+        "/oauth/authorize", "/oauth/invalid/", "/oauth/errors/", "/oauth/token",
+        "/oauth/ping/", "/oauth/info/", "/slack"]},
+}
+
+INDICATORS = ['g', 'read10', 'm', 'i10', 'riq', 'h', 'i100', 'tori']
+BASIC_STATS = ['median number of downloads', 'average number of reads',
+               'normalized paper count', 'recent number of reads', 'number of papers',
+               'recent number of downloads', 'total number of reads',
+               'median number of reads', 'total number of downloads',
+               'average number of downloads']
+CITATION_STATS = ['normalized number of citations', 'average number of refereed citations',
+                  'median number of citations', 'median number of refereed citations',
+                  'number of citing papers', 'average number of citations',
+                  'total number of refereed citations',
+                  'normalized number of refereed citations',
+                  'number of self-citations', 'total number of citations']
+HISTOGRAMS = {
+    'downloads': ['refereed downloads', 'all downloads normalized',
+                  'all downloads', 'refereed downloads normalized'],
+    'reads': ['refereed reads', 'all reads normalized',
+              'all reads', 'refereed reads normalized'],
+    'publications': ['refereed publications', 'all publications',
+                     'refereed publications normalized', 'all publications normalized'],
+    'citations': ['refereed to nonrefereed', 'nonrefereed to nonrefereed',
+                  'nonrefereed to nonrefereed normalized', 'nonrefereed to refereed',
+                  'refereed to refereed normalized', 'refereed to nonrefereed normalized',
+                  'refereed to refereed', 'nonrefereed to refereed normalized'],
+}
+TIME_SERIES = ['g', 'h', 'tori', 'i10', 'read10', 'i100']
+WORDS = ['galaxy', 'star', 'cluster', 'spectrum', 'survey', 'model', 'emission',
+         'redshift', 'mass', 'disk', 'dust', 'telescope', 'catalog', 'archive',
+         'data', 'system', 'library', 'abstract', 'service', 'network']
+
+
+# one record of every export format, records are counted by the start of
+# their first line
+EXPORT_FORMATS = {
+    'bibtex': ('@ARTICLE{%(bibcode)s,\n   author = {{Author}, A.},\n    title = "{%(title)s}",\n'
+               '     year = %(year)s,\n   adsurl = {https://ui.adsabs.harvard.edu/abs/%(bibcode)s},\n}\n\n'),
+    'aastex': '\\bibitem[Author(%(year)s)]{%(bibcode)s} Author, A.\\ %(year)s, %(title)s\n',
+    'icarus': '\\bibitem[{Author(%(year)s)}]{%(bibcode)s} Author, A.\\ %(year)s.\\ %(title)s.\n',
+    'mnras': '\\bibitem[\\protect\\citeauthoryear{Author}{%(year)s}]{%(bibcode)s} Author A., %(year)s, %(title)s\n',
+    'soph': '\\bibitem[Author(%(year)s)]{%(bibcode)s} Author, A.: %(year)s, %(title)s\n',
+    'endnote': '%%0 Journal Article\n%%A Author, A.\n%%T %(title)s\n%%D %(year)s\n%%U %(bibcode)s\n\n',
+    'ris': 'TY  - JOUR\nAU  - Author, A.\nTI  - %(title)s\nPY  - %(year)s\nUR  - %(bibcode)s\nER  - \n\n',
+}
+
+
+def is_bibcode(value):
+    return len(value) == 19 and value[0:4].isdigit()
+
+
+def corpus_bibcode(i):
+    # the synthetic corpus every search/bigquery/biblib answer is drawn from
+    return '%04dSYNTH%09dA' % (1990 + i % 30, i)
+
+
+def seeded(value):
+    return random.Random(int(hashlib.md5(value.encode('utf-8')).hexdigest()[0:8], 16))
+
+
+def years(rnd, start=1990, end=2016):
+    return dict((str(y), rnd.randint(0, 50)) for y in range(start, end + 1))
+
+
+class StandIn(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 4096
+
+    def __init__(self, address, latency=0.0, jitter=0.0, error_rate=0.0,
+                 rate_limit=5000, rate_window=86400, corpus_size=100000, prefix='/v1',
+                 gzip_min_size=1024):
+        HTTPServer.__init__(self, address, Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.corpus_size = corpus_size
+        self.prefix = prefix
+        # bodies from this size on are gzipped for clients that accept it
+        self.gzip_min_size = gzip_min_size
+        self.lock = threading.Lock()
+        self.limits = {}
+        self.user_data = {}
+        self.queries = {}
+        self.libraries = {}
+        self.orcid_works = {}
+
+    @property
+    def url(self):
+        return 'http://%s:%d%s' % (self.server_address[0], self.server_address[1], self.prefix)
+
+    def spend(self, token):
+        # returns (limit, remaining, reset) after charging one request
+        now = time.time()
+        with self.lock:
+            remaining, reset = self.limits.get(token, (self.rate_limit, int(now) + self.rate_window))
+            if now >= reset:
+                remaining, reset = self.rate_limit, int(now) + self.rate_window
+            remaining -= 1
+            self.limits[token] = (remaining, reset)
+        return self.rate_limit, remaining, reset
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are separate writes; with Nagle on, keep-alive
+    # clients wait for the delayed ack (~40ms) on every response
+    disable_nagle_algorithm = True
+
+    routes = [
+        ('GET', r'/accounts/bootstrap', 'bootstrap', False),
+        ('GET', r'/resources', 'resources', False),
+        ('GET', r'/status', 'status', False),
+        ('GET', r'/harbour/version', 'harbour_version', True),
+        ('POST', r'/metrics/?', 'metrics', True),
+        ('GET', r'/metrics/(?P<bibcode>[^/]+)', 'metrics_one', True),
+        ('GET', r'/graphics/(?P<bibcode>[^/]+)', 'graphics', True),
+        ('GET', r'/recommender/(?P<bibcode>[^/]+)', 'recommender', True),
+        ('POST', r'/citation_helper/?', 'citation_helper', True),
+        ('POST', r'/vis/word-cloud', 'word_cloud', True),
+        ('POST', r'/vis/paper-network', 'paper_network', True),
+        ('POST', r'/vis/author-network', 'author_network', True),
+        ('GET', r'/vault/configuration', 'vault_configuration', True),
+        ('GET', r'/vault/configuration/(?P<key>[^/]+)', 'vault_configuration', True),
+        ('GET', r'/vault/user-data', 'vault_user_data', True),
+        ('POST', r'/vault/user-data', 'vault_user_data', True),
+        ('POST', r'/vault/query', 'vault_query', True),
+        ('GET', r'/vault/query/(?P<qid>[^/]+)', 'vault_get_query', True),
+        ('GET', r'/vault/execute_query/(?P<qid>[^/]+)', 'vault_execute_query', True),
+        ('GET', r'/vault/query2svg/(?P<qid>[^/]+)', 'vault_query2svg', True),
+        ('GET', r'/search/query', 'search_query', True),
+        ('POST', r'/search/bigquery', 'bigquery', True),
+        ('POST', r'/export/(?P<format>%s)' % '|'.join(EXPORT_FORMATS), 'export', True),
+        ('GET', r'/biblib/libraries', 'biblib_libraries', True),
+        ('POST', r'/biblib/libraries', 'biblib_create', True),
+        ('GET', r'/biblib/libraries/(?P<library>[^/]+)', 'biblib_library', True),
+        ('POST', r'/biblib/documents/(?P<library>[^/]+)', 'biblib_documents', True),
+        ('PUT', r'/biblib/documents/(?P<library>[^/]+)', 'biblib_update', True),
+        ('DELETE', r'/biblib/documents/(?P<library>[^/]+)', 'biblib_delete', True),
+        ('GET', r'/biblib/permissions/(?P<library>[^/]+)', 'biblib_permissions', True),
+        ('POST', r'/biblib/permissions/(?P<library>[^/]+)', 'biblib_permissions', True),
+        ('GET', r'/orcid/exchangeOAuthCode', 'orcid_exchange', True),
+        ('GET', r'/orcid/(?P<orcid>[^/]+)/orcid-profile', 'orcid_profile', True),
+        ('PUT', r'/orcid/(?P<orcid>[^/]+)/orcid-works', 'orcid_works', True),
+        ('POST', r'/orcid/(?P<orcid>[^/]+)/orcid-works', 'orcid_works', True),
+    ]
+    routes = [(m, re.compile('^' + p + '$'), h, a) for m, p, h, a in routes]
+
+    # the orcid login form; it lives outside of the api prefix
+    root_routes = [
+        ('POST', re.compile(r'^/oauth/custom/login\.json$'), 'orcid_login', False),
+        ('GET', re.compile(r'^/resources$'), 'resources', False),
+    ]
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_PUT(self):
+        self.dispatch('PUT')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    def do_OPTIONS(self):
+        self.read_body()
+        self.respond(200, '', CORS_HEADERS)
+
+    @property
+    def token(self):
+        auth = self.headers.get('Authorization') or ''
+        for prefix in ('Bearer:', 'Bearer '):
+            if auth.startswith(prefix):
+                return auth[len(prefix):].strip()
+        return ''
+
+    def read_body(self):
+        if (self.headers.get('Transfer-Encoding') or '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b';')[0].strip(), 16)
+                if not size:
+                    # optional trailers, up to an empty line
+                    while self.rfile.readline().strip():
+                        pass
+                    return b''.join(chunks)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def json_body(self):
+        body = self.read_body()
+        return json.loads(body.decode('utf-8')) if body else {}
+
+    def dispatch(self, method):
+        server = self.server
+        url = urlparse(self.path)
+        self.query = dict((k, v[-1]) for k, v in parse_qs(url.query).items())
+        path = url.path
+        routes = self.root_routes
+        if path.startswith(server.prefix + '/'):
+            path = path[len(server.prefix):]
+            routes = self.routes
+        for m, pattern, handler, protected in routes:
+            match = pattern.match(path)
+            if match and m == method:
+                break
+        else:
+            self.read_body()
+            return self.respond(404, {'error': 'Not found: %s %s' % (method, url.path)})
+
+        if server.latency or server.jitter:
+            time.sleep(max(server.latency + random.uniform(-server.jitter, server.jitter), 0))
+
+        headers = {}
+        if protected:
+            if not self.token:
+                self.read_body()
+                return self.respond(401, {'error': 'Unauthorized'})
+            limit, remaining, reset = server.spend(self.token)
+            headers = {'X-RateLimit-Limit': str(limit),
+                       'X-RateLimit-Remaining': str(max(remaining, 0)),
+                       'X-RateLimit-Reset': str(reset)}
+            if remaining < 0:
+                self.read_body()
+                return self.respond(429, {'error': 'Too many requests'}, headers)
+        if server.error_rate and random.random() < server.error_rate:
+            self.read_body()
+            return self.respond(503, {'error': 'Injected error'}, headers)
+
+        status, body, extra = getattr(self, handler)(**match.groupdict())
+        headers.update(extra or {})
+        self.respond(status, body, headers)
+
+    def respond(self, status, body, headers=None):
+        headers = dict(headers or {})
+        if not isinstance(body, (bytes, type(u''))):
+            body = json.dumps(body)
+            headers.setdefault('Content-Type', 'application/json')
+        if not isinstance(body, bytes):
+            body = body.encode('utf-8')
+        accept = self.headers.get('Accept-Encoding') or ''
+        if (self.server.gzip_min_size is not None and len(body) >= self.server.gzip_min_size
+                and 'gzip' in accept):
+            buf = BytesIO()
+            with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=6) as f:
+                f.write(body)
+            body = buf.getvalue()
+            headers['Content-Encoding'] = 'gzip'
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # accounts
+
+    def bootstrap(self):
+        expires = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+        if self.token:
+            token, username = self.token, 'tester@ads'
+        else:
+            token = hashlib.sha1(('%s%s' % (time.time(), random.random())).encode('ascii')).hexdigest()
+            username = 'anonymous@ads'
+        return 200, {'access_token': token, 'refresh_token': token[::-1],
+                     'username': username, 'scopes': ['api', 'execute-query', 'store-query'],
+                     'token_type': 'Bearer', 'expire_in': expires.isoformat()}, None
+
+    def resources(self):
+        if self.server.prefix and self.path.startswith(self.server.prefix):
+            return 404, {'error': 'Not found'}, None
+        return 200, RESOURCES, None
+
+    def status(self):
+        return 200, {'app': 'adsws.api', 'status': 'online'}, None
+
+    def harbour_version(self):
+        return 200, {'version': 'standin'}, None
+
+    # metrics
+
+    def metrics(self):
+        bibcodes = self.json_body().get('bibcodes') or []
+        if not bibcodes:
+            return 403, {'Error': 'Unable to get results!',
+                         'Error Info': 'No bibcodes found in POST body'}, None
+        return 200, self.metrics_for(bibcodes), None
+
+    def metrics_one(self, bibcode):
+        return 200, self.metrics_for([bibcode]), None
+
+    def metrics_for(self, bibcodes):
+        rnd = seeded(bibcodes[0] + str(len(bibcodes)))
+        good = [b for b in bibcodes if is_bibcode(b)]
+        data = {'skipped bibcodes': [b for b in bibcodes if not is_bibcode(b)],
+                'histograms': {}}
+        for name in ('indicators', 'indicators refereed'):
+            data[name] = dict((k, rnd.randint(0, 100)) for k in INDICATORS)
+        for name in ('basic stats', 'basic stats refereed'):
+            data[name] = dict((k, rnd.randint(0, 1000)) for k in BASIC_STATS)
+            data[name]['number of papers'] = len(good)
+        for name in ('citation stats', 'citation stats refereed'):
+            data[name] = dict((k, rnd.randint(0, 1000)) for k in CITATION_STATS)
+        for hist, names in HISTOGRAMS.items():
+            data['histograms'][hist] = dict((n, years(rnd)) for n in names)
+        data['time series'] = dict((k, years(rnd)) for k in TIME_SERIES)
+        return data
+
+    # graphics, recommender, citation helper
+
+    def graphics(self, bibcode):
+        if not is_bibcode(bibcode):
+            return 200, {'Error': 'Unable to get results!',
+                         'Error Info': 'No database entry found for %s' % bibcode}, None
+        rnd = seeded(bibcode)
+        figures = []
+        for i in range(rnd.randint(1, 5)):
+            images = [{'image_id': '%s_%d_%d' % (bibcode, i, j), 'format': 'gif',
+                       'thumbnail': 'http://example.org/%s/%d/%d_thumb.gif' % (bibcode, i, j),
+                       'highres': 'http://example.org/%s/%d/%d.gif' % (bibcode, i, j)}
+                      for j in range(rnd.randint(1, 3))]
+            figures.append({'images': images, 'figure_caption': 'Figure %d' % (i + 1),
+                            'figure_label': 'Figure %d' % (i + 1), 'figure_id': 'fg%d' % i})
+        return 200, {'bibcode': bibcode, 'eprint': False, 'figures': figures,
+                     'header': 'Every image links to the article'}, None
+
+    def recommender(self, bibcode):
+        if not is_bibcode(bibcode):
+            return 200, {'Error': 'Unable to get results!',
+                         'Error Info': 'No data available to generate recommendations'}, None
+        rnd = seeded(bibcode)
+        return 200, {'paper': bibcode, 'recommendations': [
+            {'title': 'Recommended paper %d' % i, 'author': 'Author, A. et al.',
+             'bibcode': corpus_bibcode(rnd.randint(0, self.server.corpus_size - 1))}
+            for i in range(7)]}, None
+
+    def citation_helper(self):
+        bibcodes = self.json_body().get('bibcodes') or []
+        rnd = seeded(''.join(bibcodes))
+        return 200, [{'title': 'Suggested paper %d' % i, 'author': 'Author, A.',
+                      'score': rnd.randint(1, 5),
+                      'bibcode': corpus_bibcode(rnd.randint(0, self.server.corpus_size - 1))}
+                     for i in range(10)], None
+
+    # vis
+
+    def word_cloud(self):
+        rnd = seeded(self.json_body().get('q', ''))
+        return 200, dict((w, {'idf': rnd.random() * 10, 'record_count': rnd.randint(1, 50),
+                              'total_occurrences': rnd.randint(1, 200)}) for w in WORDS), None
+
+    def paper_network(self):
+        bibcodes = self.json_body().get('bibcodes') or []
+        rnd = seeded(''.join(bibcodes))
+        nodes = [{'node_name': i, 'nodeWeight': rnd.randint(1, 100), 'group': i % 7,
+                  'node_label': {b: 1}, 'bibcode': b} for i, b in enumerate(bibcodes)]
+        links = []
+        for i in range(1, len(nodes)):
+            for j in set([i - 1, rnd.randrange(i)]):
+                links.append({'source': j, 'target': i, 'weight': rnd.randint(1, 10)})
+        return 200, {'msg': {'numFound': len(bibcodes), 'start': 0, 'rows': len(bibcodes)},
+                     'data': {'fullGraph': {'nodes': nodes, 'links': links},
+                              'summaryGraph': {'nodes': [], 'links': []}}}, None
+
+    def author_network(self):
+        bibcodes = self.json_body().get('bibcodes') or []
+        rnd = seeded(''.join(bibcodes))
+        authors = max(3, len(bibcodes))
+        nodes = [{'nodeName': 'Author, %d.' % i, 'nodeWeight': rnd.randint(1, 20),
+                  'papers': [], 'group': i % 5} for i in range(authors)]
+        links = set()
+        for b in bibcodes:
+            coauthors = sorted(rnd.sample(range(authors), 3))
+            nodes[coauthors[0]]['papers'].append(b)
+            links.update([(coauthors[0], coauthors[1]), (coauthors[1], coauthors[2])])
+        links = [{'source': s, 'target': t, 'weight': 1} for s, t in sorted(links)]
+        return 200, {'msg': {'numFound': len(bibcodes), 'start': 0, 'rows': len(bibcodes)},
+                     'data': {'fullGraph': {'nodes': nodes, 'links': links}}}, None
+
+    # vault
+
+    def vault_configuration(self, key=None):
+        conf = {'link_servers': [{'name': 'Harvard University', 'link': 'http://sfx.hul.harvard.edu/sfx_local',
+                                  'gif': 'http://sfx.hul.harvard.edu/sfx_local/sfx.gif'}],
+                'ui_version': 'standin'}
+        if key is None:
+            return 200, conf, None
+        if key not in conf:
+            return 404, {'msg': 'Unknown key: %s' % key}, None
+        return 200, conf[key], None
+
+    def vault_user_data(self):
+        with self.server.lock:
+            data = self.server.user_data.setdefault(self.token, {})
+            if self.command == 'POST':
+                data.update(self.json_body())
+            return 200, dict(data), None
+
+    def vault_query(self):
+        query = self.json_body()
+        qid = hashlib.md5(json.dumps(query, sort_keys=True).encode('utf-8')).hexdigest()
+        with self.server.lock:
+            self.server.queries[qid] = query
+        return 200, {'qid': qid, 'numfound': self.server.corpus_size}, None
+
+    def vault_get_query(self, qid):
+        if qid not in self.server.queries:
+            return 404, {'msg': 'Query not found'}, None
+        return 200, {'qid': qid, 'query': json.dumps({'query': self.server.queries[qid]}),
+                     'numfound': self.server.corpus_size}, None
+
+    def vault_execute_query(self, qid):
+        if qid not in self.server.queries:
+            return 404, {'msg': 'Query not found'}, None
+        params = dict(self.server.queries[qid])
+        params['fl'] = self.query.get('fl', 'id')
+        return self.search(params)
+
+    def vault_query2svg(self, qid):
+        svg = ('<svg xmlns="http://www.w3.org/2000/svg" width="100" height="20">'
+               '<text x="5" y="15">%d</text></svg>' % self.server.corpus_size)
+        return 200, svg, {'Content-Type': 'image/svg+xml'}
+
+    # search
+
+    def search_query(self):
+        return self.search(self.query)
+
+    def search(self, params):
+        # documents come in corpus order whatever the sort; a cursor mark is
+        # the position of the next document
+        mark = params.get('cursorMark')
+        if mark is not None:
+            if 'start' in params:
+                return 400, {'error': 'Cursor functionality does not work with start'}, None
+            start = 0 if mark == '*' else int(mark[3:], 16)
+        else:
+            start = int(params.get('start', 0))
+        rows = int(params.get('rows', 10))
+        fields = (params.get('fl') or 'id').split(',')
+        numfound = self.server.corpus_size
+        docs = []
+        for i in range(start, min(start + rows, numfound)):
+            doc = {'id': str(i), 'recid': i, 'bibcode': corpus_bibcode(i)}
+            docs.append(dict((f, doc[f]) for f in fields if f in doc))
+        body = {'responseHeader': {'status': 0, 'QTime': 1, 'params': dict(params)},
+                'response': {'numFound': numfound, 'start': start, 'docs': docs}}
+        if mark is not None:
+            body['nextCursorMark'] = 'AoE%x' % (start + len(docs)) if docs else mark
+        return 200, body, None
+
+    def bigquery(self):
+        # every well formed bibcode of the list is found, once
+        lines = self.read_body().decode('utf-8').split('\n')
+        if lines[0].strip() != 'bibcode':
+            return 400, {'error': 'The first line of a bigquery has to be "bibcode"'}, None
+        found, seen = [], set()
+        for bibcode in lines[1:]:
+            bibcode = bibcode.strip()
+            if is_bibcode(bibcode) and bibcode not in seen:
+                seen.add(bibcode)
+                found.append(bibcode)
+        start = int(self.query.get('start', 0))
+        rows = int(self.query.get('rows', 10))
+        fields = (self.query.get('fl') or 'id').split(',')
+        docs = []
+        for bibcode in found[start:start + rows]:
+            doc = {'id': str(seeded(bibcode).randint(0, 10 ** 8)), 'bibcode': bibcode}
+            docs.append(dict((f, doc[f]) for f in fields if f in doc))
+        return 200, {'responseHeader': {'status': 0, 'QTime': 1, 'params': dict(self.query)},
+                     'response': {'numFound': len(found), 'start': start, 'docs': docs}}, None
+
+    # export
+
+    def export(self, format):
+        bibcodes = [b for b in self.json_body().get('bibcode') or [] if is_bibcode(b)]
+        if not bibcodes:
+            return 404, {'error': 'no result from solr'}, None
+        template = EXPORT_FORMATS[format]
+        records = [template % {'bibcode': b, 'year': b[0:4],
+                               'title': 'Synthetic record %s' % b} for b in bibcodes]
+        return 200, {'msg': 'Retrieved %d abstracts, starting with number 1.' % len(records),
+                     'export': ''.join(records)}, None
+
+    # biblib; libraries belong to the token that created them
+
+    def find_library(self, library, permission='read'):
+        # (library, None) or (None, error response); under the server lock
+        lib = self.server.libraries.get(library)
+        if lib is None:
+            return None, (404, {'error': 'Library does not exist'}, None)
+        # others may only read public libraries
+        if lib['owner'] != self.token and (permission != 'read' or not lib['public']):
+            return None, (403, {'error': 'You do not have the correct permissions'}, None)
+        return lib, None
+
+    def library_metadata(self, library, lib):
+        return {'id': library, 'name': lib['name'], 'description': lib['description'],
+                'public': lib['public'], 'num_documents': len(lib['documents']),
+                'owner': 'tester', 'permission': 'owner',
+                'date_created': lib['created'], 'date_last_modified': lib['modified']}
+
+    def biblib_libraries(self):
+        with self.server.lock:
+            return 200, {'libraries': [self.library_metadata(i, lib)
+                                       for i, lib in self.server.libraries.items()
+                                       if lib['owner'] == self.token]}, None
+
+    def biblib_create(self):
+        data = self.json_body()
+        if not data.get('name'):
+            return 400, {'error': 'Library name missing'}, None
+        now = datetime.datetime.utcnow().isoformat()
+        library = hashlib.md5(('%s%s' % (time.time(), random.random())).encode('ascii')).hexdigest()
+        with self.server.lock:
+            if any(lib['name'] == data['name'] and lib['owner'] == self.token
+                   for lib in self.server.libraries.values()):
+                return 409, {'error': 'Library name given already exists'}, None
+            documents = []
+            for bibcode in data.get('bibcode') or []:
+                if bibcode not in documents:
+                    documents.append(bibcode)
+            self.server.libraries[library] = {
+                'owner': self.token, 'name': data['name'],
+                'description': data.get('description', ''), 'public': bool(data.get('public')),
+                'documents': documents, 'permissions': {}, 'created': now, 'modified': now}
+        return 200, {'id': library, 'name': data['name'], 'description': data.get('description', ''),
+                     'bibcode': documents}, None
+
+    def biblib_library(self, library):
+        start = int(self.query.get('start', 0))
+        rows = int(self.query.get('rows', 20))
+        with self.server.lock:
+            lib, error = self.find_library(library)
+            if error:
+                return error
+            page = lib['documents'][start:start + rows]
+            metadata = self.library_metadata(library, lib)
+        return 200, {'documents': page, 'metadata': metadata,
+                     'solr': {'response': {'numFound': len(page), 'start': 0,
+                                           'docs': [{'bibcode': b} for b in page]}},
+                     'updates': {'num_updated': 0, 'duplicates_removed': 0,
+                                 'update_list': []}}, None
+
+    def biblib_documents(self, library):
+        data = self.json_body()
+        bibcodes = data.get('bibcode') or []
+        with self.server.lock:
+            lib, error = self.find_library(library, 'write')
+            if error:
+                return error
+            lib['modified'] = datetime.datetime.utcnow().isoformat()
+            if data.get('action') == 'add':
+                present = set(lib['documents'])
+                added = []
+                for bibcode in bibcodes:
+                    if bibcode not in present:
+                        present.add(bibcode)
+                        added.append(bibcode)
+                lib['documents'].extend(added)
+                return 200, {'number_added': len(added)}, None
+            if data.get('action') == 'remove':
+                remove = set(bibcodes)
+                before = len(lib['documents'])
+                lib['documents'] = [b for b in lib['documents'] if b not in remove]
+                return 200, {'number_removed': before - len(lib['documents'])}, None
+        return 400, {'error': 'Unknown action'}, None
+
+    def biblib_update(self, library):
+        data = self.json_body()
+        with self.server.lock:
+            lib, error = self.find_library(library, 'admin')
+            if error:
+                return error
+            for key in ('name', 'description', 'public'):
+                if key in data:
+                    lib[key] = data[key]
+        return 200, dict((k, data[k]) for k in ('name', 'description', 'public') if k in data), None
+
+    def biblib_delete(self, library):
+        with self.server.lock:
+            lib, error = self.find_library(library, 'owner')
+            if error:
+                return error
+            del self.server.libraries[library]
+        return 200, {}, None
+
+    def biblib_permissions(self, library):
+        data = self.json_body() if self.command == 'POST' else None
+        with self.server.lock:
+            lib, error = self.find_library(library, 'admin' if data else 'read')
+            if error:
+                return error
+            if data:
+                permissions = lib['permissions'].setdefault(data['email'], {})
+                permissions.update(data.get('permission') or {})
+                return 200, {}, None
+            return 200, [{'tester@ads': ['owner']}] + [
+                {email: sorted(p for p, on in perms.items() if on)}
+                for email, perms in sorted(lib['permissions'].items())], None
+
+    # orcid
+
+    def orcid_login(self):
+        data = self.json_body()
+        code = hashlib.md5(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()[0:6]
+        redirect = data.get('redirectUri', {}).get('value', '')
+        return 200, {'redirectUri': {'value': '%s?code=%s' % (redirect, code)}}, None
+
+    def orcid_exchange(self):
+        code = self.query.get('code')
+        if not code:
+            return 400, {'error': 'Missing code'}, None
+        return 200, {'access_token': hashlib.sha1(code.encode('utf-8')).hexdigest(),
+                     'orcid': '0000-0001-9886-2511', 'name': 'Stand-in User',
+                     'expires_in': 631138518, 'scope': '/orcid-profile/read-limited'}, None
+
+    def orcid_profile(self, orcid):
+        if not self.headers.get('Orcid-Authorization'):
+            return 401, {'error': 'Missing Orcid-Authorization'}, None
+        with self.server.lock:
+            works = list(self.server.orcid_works.get(orcid, []))
+        return 200, {'message-version': '1.2', 'orcid-profile': {
+            'orcid-identifier': {'path': orcid},
+            'orcid-activities': {'orcid-works': {'orcid-work': works}}}}, None
+
+    def orcid_works(self, orcid):
+        if not self.headers.get('Orcid-Authorization'):
+            self.read_body()
+            return 401, {'error': 'Missing Orcid-Authorization'}, None
+        works = self.json_body()['orcid-profile']['orcid-activities']['orcid-works']['orcid-work']
+        with self.server.lock:
+            if self.command == 'PUT':
+                self.server.orcid_works[orcid] = list(works)
+                return 200, {}, None
+            # posted works replace the ones with the same external identifiers
+            current = self.server.orcid_works.setdefault(orcid, [])
+            keys = set(work_key(w) for w in works)
+            current[:] = [w for w in current if work_key(w) not in keys] + list(works)
+        return 201, {}, None
+
+
+def work_key(work):
+    ids = (work.get('work-external-identifiers') or {}).get('work-external-identifier') or []
+    return tuple(sorted((i['work-external-identifier-type'],
+                         i['work-external-identifier-id']['value']) for i in ids))
+
+
+def start(host='127.0.0.1', port=0, **options):
+    # runs the server in a daemon thread; port 0 picks a free one
+    server = StandIn((host, port), **options)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local stand-in for the ADS API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='+/- seconds of uniform noise on the latency')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of requests answered with a 503')
+    parser.add_argument('--rate-limit', type=int, default=5000,
+                        help='requests per token and rate window')
+    parser.add_argument('--rate-window', type=int, default=86400)
+    parser.add_argument('--no-gzip', action='store_true',
+                        help='never compress the responses')
+    args = parser.parse_args(argv)
+    server = StandIn((args.host, args.port), latency=args.latency, jitter=args.jitter,
+                     error_rate=args.error_rate, rate_limit=args.rate_limit,
+                     rate_window=args.rate_window,
+                     gzip_min_size=None if args.no_gzip else 1024)
+    sys.stderr.write('ADS API stand-in listening on %s\n' % server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
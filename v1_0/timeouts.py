@@ -0,0 +1,48 @@
+# Every request of a user role gets a (connect, read) timeout: the one of
+# its endpoint in ROUTE_TIMEOUTS ('POST /search/bigquery' or just the route),
+# TIMEOUT otherwise. While a test runs the conftest also sets a deadline,
+# TEST_DEADLINE seconds (pytest.mark.deadline(seconds) for a single test);
+# the timeouts never reach past it and once it has passed requests fail
+# right away with DeadlineExceeded. The read timeout is the longest wait
+# for the next bytes, a response that keeps trickling in can take longer.
+
+import time
+import threading
+
+from . import config
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+_deadline = {'at': None, 'seconds': None}
+_lock = threading.Lock()
+
+
+def start_deadline(seconds):
+    with _lock:
+        _deadline['at'] = time.time() + seconds if seconds else None
+        _deadline['seconds'] = seconds
+
+
+def clear_deadline():
+    start_deadline(None)
+
+
+def remaining():
+    # seconds left until the deadline, None without one
+    at = _deadline['at']
+    return None if at is None else at - time.time()
+
+
+def timeout(method, route):
+    connect, read = config.ROUTE_TIMEOUTS.get('%s %s' % (method, route),
+                                              config.ROUTE_TIMEOUTS.get(route, config.TIMEOUT))
+    left = remaining()
+    if left is None:
+        return connect, read
+    if left <= 0:
+        raise DeadlineExceeded('%s %s: the deadline of %ss has passed' % (
+                               method, route, _deadline['seconds']))
+    return min(connect, left), min(read, left)
@@ -0,0 +1,188 @@
+import re
+import json
+import threading
+import contextlib
+from collections import OrderedDict
+
+try:
+    from urlparse import urlparse
+except ImportError:
+    from urllib.parse import urlparse
+
+
+# Concrete paths are reported under these templates (the way they are listed
+# in /resources), paths that match none of them are reported as they are
+ROUTES = [
+    '/metrics/<bibcode>',
+    '/graphics/<bibcode>',
+    '/recommender/<bibcode>',
+    '/vault/configuration/<key>',
+    '/vault/query/<queryid>',
+    '/vault/execute_query/<queryid>',
+    '/vault/query2svg/<queryid>',
+    '/orcid/preferences/<orcid_id>',
+    '/orcid/get-profile/<orcid_id>',
+    '/orcid/export/<iso_datestring>',
+    '/orcid/<orcid_id>/orcid-profile',
+    '/orcid/<orcid_id>/orcid-works',
+    '/biblib/libraries/<library>',
+    '/biblib/documents/<library>',
+    '/biblib/permissions/<library>',
+    '/biblib/transfer/<library>',
+    '/objects/pos/<pstring>',
+    '/harbour/libraries/twopointoh/<uid>',
+    '/harbour/libraries/classic/<uid>',
+    '/harbour/export/twopointoh/<export>',
+    '/user/<identifier>',
+]
+ROUTES = [(re.compile('^' + re.sub(r'<[^>]+>', '[^/]+', r) + '$'), r) for r in ROUTES]
+
+# upper edges of the histogram buckets, in milliseconds
+BUCKETS = [5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, float('inf')]
+
+
+def normalize_route(url, api_url):
+    # '/v1/metrics/1993CoPhC..74..239H' -> '/metrics/<bibcode>'; urls
+    # outside of the api (the orcid login) keep their host
+    url, base = urlparse(url), urlparse(api_url)
+    path = url.path
+    if url.netloc and url.netloc != base.netloc:
+        return url.netloc + path
+    if path.startswith(base.path + '/'):
+        path = path[len(base.path):]
+    path = path.rstrip('/') or '/'
+    for pattern, template in ROUTES:
+        if pattern.match(path):
+            return template
+    return path
+
+
+def percentile(values, p):
+    # nearest rank, values have to be sorted
+    if not values:
+        return None
+    k = int(round(p / 100.0 * (len(values) - 1)))
+    return values[k]
+
+
+class Recorder(object):
+    # Collects (elapsed, status, size) for every request, keyed by the
+    # method and the route template. Status 0 means no response at all.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.decodes = {}
+
+    def record(self, method, route, status, elapsed, size):
+        with self.lock:
+            self.samples.setdefault((method, route), []).append((elapsed, status, size))
+
+    def record_decode(self, method, route, elapsed):
+        # seconds spent decoding the json body, once per response
+        with self.lock:
+            self.decodes.setdefault((method, route), []).append(elapsed)
+
+    def merge(self, samples):
+        # samples as [method, route, [(elapsed, status, size), ...], decodes]
+        # lists, the way xdist workers send them back to the controller
+        with self.lock:
+            for method, route, values, decodes in samples:
+                self.samples.setdefault((method, route), []).extend(tuple(v) for v in values)
+                self.decodes.setdefault((method, route), []).extend(decodes)
+
+    def dump(self):
+        with self.lock:
+            return [[method, route, list(values), list(self.decodes.get((method, route), []))]
+                    for (method, route), values in self.samples.items()]
+
+    def reset(self):
+        with self.lock:
+            samples, self.samples = self.samples, {}
+            self.decodes = {}
+        return samples
+
+    def stats(self):
+        out = OrderedDict()
+        with self.lock:
+            items = [(key, list(values)) for key, values in self.samples.items()]
+            decodes = dict((key, sorted(values)) for key, values in self.decodes.items())
+        for (method, route), values in sorted(items, key=lambda x: (x[0][1], x[0][0])):
+            times = sorted(v[0] for v in values)
+            decode = decodes.get((method, route), [])
+            statuses = {}
+            for v in values:
+                statuses[str(v[1])] = statuses.get(str(v[1]), 0) + 1
+            histogram = [0] * len(BUCKETS)
+            for t in times:
+                for i, edge in enumerate(BUCKETS):
+                    if t * 1000 <= edge:
+                        histogram[i] += 1
+                        break
+            out['%s %s' % (method, route)] = {
+                'method': method,
+                'route': route,
+                'count': len(values),
+                'errors': sum(1 for v in values if v[1] == 0 or v[1] >= 500),
+                'statuses': statuses,
+                'mean': sum(times) / len(times),
+                'p50': percentile(times, 50),
+                'p95': percentile(times, 95),
+                'p99': percentile(times, 99),
+                'max': times[-1],
+                'bytes': sum(v[2] for v in values),
+                'histogram': histogram,
+                'decodes': len(decode),
+                'decode_p50': percentile(decode, 50),
+                'decode_max': decode[-1] if decode else None,
+            }
+        return out
+
+    def write_json(self, path, **extra):
+        data = dict(extra)
+        data['buckets_ms'] = [b if b != float('inf') else None for b in BUCKETS]
+        data['endpoints'] = self.stats()
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+
+    def report(self):
+        # one line per endpoint; the histogram column is a sparkline over
+        # BUCKETS, denser characters mean more requests in the bucket
+        stats = self.stats()
+        if not stats:
+            return []
+        shades = ' .:-=+*#%@'
+        lines = ['%-44s %6s %4s %8s %8s %8s %9s %8s  %s' % (
+                 'endpoint', 'count', 'err', 'p50 ms', 'p95 ms', 'p99 ms', 'kB', 'json ms',
+                 '|<%s ms|' % ','.join('%g' % b for b in BUCKETS[:-1]))]
+        for name, s in stats.items():
+            top = max(s['histogram'])
+            spark = ''.join(shades[int(round(float(c) / top * (len(shades) - 1)))]
+                            if c else ' ' for c in s['histogram'])
+            decode = '%8.2f' % (s['decode_p50'] * 1000) if s['decodes'] else '%8s' % '-'
+            lines.append('%-44s %6d %4d %8.1f %8.1f %8.1f %9.1f %s  |%s|' % (
+                         name[0:44], s['count'], s['errors'], s['p50'] * 1000,
+                         s['p95'] * 1000, s['p99'] * 1000, s['bytes'] / 1024.0, decode, spark))
+        return lines
+
+
+recorder = Recorder()
+
+
+# the requests of the current thread, (method, route, status, seconds) as
+# the user roles were asked to make them; see capture()
+_captured = threading.local()
+
+
+@contextlib.contextmanager
+def capture():
+    samples = []
+    _captured.samples = samples
+    try:
+        yield samples
+    finally:
+        _captured.samples = None
+
+
+def captured():
+    return getattr(_captured, 'samples', None)
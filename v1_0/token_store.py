@@ -0,0 +1,113 @@
+import os
+import json
+import time
+import fcntl
+import hashlib
+import tempfile
+import contextlib
+
+
+def private_dir(path):
+    # the directory of path, created readable by this user only
+    directory = os.path.dirname(path) or '.'
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory, 0o700)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+    return directory
+
+
+def write_private(path, data):
+    # json to path through a temporary file that mkstemp creates with a
+    # name nobody can guess and mode 0600; readers see either the old or
+    # the new file
+    fd, tmp = tempfile.mkstemp(dir=private_dir(path), prefix=os.path.basename(path) + '.')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.rename(tmp, path)
+    except Exception:
+        os.remove(tmp)
+        raise
+
+
+class TokenStore(object):
+    # A small json file of {key: {'value': ..., 'expires': epoch}} that is
+    # shared by every test process (xdist workers, re-runs). Readers never
+    # block; a process that finds no valid entry takes an exclusive lock,
+    # checks again and only then fetches, so a token is fetched once.
+
+    def __init__(self, path, margin=60):
+        self.path = path
+        self.margin = margin
+
+    @contextlib.contextmanager
+    def locked(self):
+        private_dir(self.path)
+        fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def get(self, key, fetch):
+        # fetch() has to return a tuple (value, expires)
+        entry = self._read().get(key)
+        if self._valid(entry):
+            return entry['value']
+        with self.locked():
+            data = self._read()
+            entry = data.get(key)
+            if self._valid(entry):
+                return entry['value']
+            value, expires = fetch()
+            data[key] = {'value': value, 'expires': expires}
+            self._write(data)
+            return value
+
+    def invalidate(self, key):
+        with self.locked():
+            data = self._read()
+            if data.pop(key, None) is not None:
+                self._write(data)
+
+    def _valid(self, entry):
+        return bool(entry) and entry['expires'] - self.margin > time.time()
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _write(self, data):
+        write_private(self.path, data)
+
+
+_leases = []
+
+def lease(tokens, directory):
+    # Returns the first of the tokens that no other process holds, or None
+    # when all are taken. The lease is an flock on a file per token, held
+    # until the process exits (so a crashed worker never keeps a token).
+    for token in tokens:
+        name = 'adsrex-lease-%s' % hashlib.sha1(token.encode('utf-8')).hexdigest()[0:12]
+        path = os.path.join(directory, name)
+        try:
+            private_dir(path)
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        except (IOError, OSError):
+            continue
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError):
+            os.close(fd)
+            continue
+        _leases.append(fd)
+        return token
+    return None
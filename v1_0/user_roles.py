@@ -1,25 +1,197 @@
+import os
 import requests
 import copy
+import time
 import logging
+import threading
+import calendar
+import datetime
+from requests.adapters import HTTPAdapter
+from requests.compat import cookielib
 from . import config
+from . import cassette
+from . import timing
+from . import phases
+from . import timeouts
+from . import hedging
+from .response import Response
+from .ratelimit import Scheduler
+from .token_store import TokenStore, lease
+
+
+scheduler = None
+if config.RATELIMIT_STATE:
+    scheduler = Scheduler(config.RATELIMIT_STATE,
+                          reserve=config.RATELIMIT_RESERVE,
+                          pace_below=config.RATELIMIT_PACE_BELOW,
+                          retries=config.RATELIMIT_RETRIES,
+                          max_wait=config.RATELIMIT_MAX_WAIT)
 
 
 class AnonymousUser(object):
 
     def __init__(self):
         self.api_url = config.API_URL
+        self.session = self.create_session()
+    
+    def create_session(self, pool_maxsize=None):
+        # keep-alive connections are pooled per host; cookies are not kept
+        # so that every request is still judged only by its own headers
+        session = requests.Session()
+        session.cookies.set_policy(cookielib.DefaultCookiePolicy(allowed_domains=[]))
+        pool = dict(pool_connections=config.POOL_CONNECTIONS,
+                    pool_maxsize=pool_maxsize or config.POOL_MAXSIZE,
+                    pool_block=config.POOL_BLOCK)
+        if config.CASSETTE_MODE:
+            adapter = cassette.CassetteAdapter(cassette.load(config.CASSETTE),
+                                               config.CASSETTE_MODE, **pool)
+        elif config.PHASE_TIMING:
+            adapter = phases.PhaseAdapter(**pool)
+        else:
+            adapter = HTTPAdapter(**pool)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+    
+    def request(self, method, url, **kwargs):
+        url = self.update_args([url])[0]
+        samples = timing.captured()
+        if samples is None:
+            return self.send(method, url, **self.update_kwargs(kwargs))
+        # what the test waited for, a bootstrap or retries included
+        route = timing.normalize_route(url, self.api_url)
+        start = time.time()
+        try:
+            r = self.send(method, url, **self.update_kwargs(kwargs))
+        except Exception:
+            samples.append((method, route, 0, time.time() - start))
+            raise
+        samples.append((method, route, r.status_code, time.time() - start))
+        return r
+    
+    def send(self, method, url, **kwargs):
+        # every request of a role ends up here with its final url and headers
+        token = (kwargs.get('headers') or {}).get('Authorization')
+        if scheduler is None or not token:
+            return self.hedged(method, url, **kwargs)
+        key = scheduler.key(self.api_url, token)
+        # a generator (or file) body is spent by the first attempt, so a 429
+        # for it is returned as it is
+        data = kwargs.get('data')
+        retries = 0 if hasattr(data, '__next__') or hasattr(data, 'next') else scheduler.retries
+        for attempt in range(retries + 1):
+            scheduler.before(key)
+            r = self.hedged(method, url, **kwargs)
+            retry = scheduler.after(key, r)
+            if retry is None or attempt == retries:
+                return r
+            scheduler.wait(retry)
+    
+    def hedged(self, method, url, **kwargs):
+        # a second request for a slow GET, when HEDGE is on
+        hedger = hedging.hedger
+        if hedger is None:
+            return self.timed(method, url, **kwargs)
+        route = timing.normalize_route(url, self.api_url)
+        if not hedger.applies(method, route):
+            return self.timed(method, url, **kwargs)
+        return hedger.run(route, lambda: self.timed(method, url, **kwargs))
+    
+    def timed(self, method, url, **kwargs):
+        route = timing.normalize_route(url, self.api_url)
+        kwargs.setdefault('timeout', timeouts.timeout(method, route))
+        start = time.time()
+        try:
+            r = self.session.request(method, url, **kwargs)
+        except Exception:
+            timing.recorder.record(method, route, 0, time.time() - start, 0)
+            raise
+        timing.recorder.record(method, route, r.status_code, time.time() - start, len(r.content))
+        response = Response(r, method, route)
+        phases.observe(response)
+        return response
+    
+    def get(self, url, params=None, **kwargs):
+        return self.request('GET', url, params=params, **kwargs)
+    
+    def post(self, url, data=None, json=None, **kwargs):
+        return self.request('POST', url, data=data, json=json, **kwargs)
+    
+    def put(self, url, data=None, **kwargs):
+        return self.request('PUT', url, data=data, **kwargs)
+    
+    def options(self, url, **kwargs):
+        return self.request('OPTIONS', url, **kwargs)
+    
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
     
-    def get(self, *args, **kwargs):
-        return requests.get(*self.update_args(args), **self.update_kwargs(kwargs))
+    def search_pages(self, params, rows=None, cursor=True, limit=None):
+        # Walks the results of /search/query and yields the response of every
+        # page, nothing of a page is kept once the next one is requested.
+        # With cursor every page continues at the nextCursorMark of the
+        # previous one (the sort gets the unique id as a tie breaker),
+        # otherwise pages are requested by start/rows. Stops at the end of
+        # the results or after limit documents
+        params = dict(params)
+        rows = rows or config.SEARCH_PAGE_ROWS
+        if cursor:
+            sort = params.get('sort') or 'score desc'
+            if 'id' not in [part.split()[0] for part in sort.split(',') if part.strip()]:
+                sort += ', id asc'
+            params['sort'] = sort
+            params['cursorMark'] = '*'
+            params.pop('start', None)
+        else:
+            params['start'] = int(params.get('start', 0))
+        seen = 0
+        while limit is None or seen < limit:
+            params['rows'] = rows if limit is None else min(rows, limit - seen)
+            # not get, that returns a pending result for the async roles
+            r = self.request('GET', '/search/query', params=dict(params))
+            r.raise_for_status()
+            data = r.json()
+            docs = data['response']['docs']
+            yield r
+            seen += len(docs)
+            if not docs:
+                return
+            if cursor:
+                if data.get('nextCursorMark') in (None, params['cursorMark']):
+                    return
+                params['cursorMark'] = data['nextCursorMark']
+            else:
+                params['start'] += len(docs)
+                if params['start'] >= data['response']['numFound']:
+                    return
     
-    def post(self, *args, **kwargs):
-        return requests.post(*self.update_args(args), **self.update_kwargs(kwargs))
+    def search(self, params, **kwargs):
+        # the documents of search_pages, one at a time
+        for r in self.search_pages(params, **kwargs):
+            for doc in r.json()['response']['docs']:
+                yield doc
     
-    def put(self, *args, **kwargs):
-        return requests.put(*self.update_args(args), **self.update_kwargs(kwargs))
+    def bigquery(self, params, bibcodes, chunk=None):
+        # Searches within a list of bibcodes of any length; bibcodes can be any
+        # iterable (a generator, a file with one bibcode per line) and is
+        # read while the request body is sent, in chunks of that many bibcodes
+        return self.request('POST', '/search/bigquery', params=params,
+                            data=bigquery_body(bibcodes, chunk or config.BIGQUERY_CHUNK),
+                            headers={'Content-Type': 'big-query/csv'})
     
-    def options(self, *args, **kwargs):
-        return requests.options(*self.update_args(args), **self.update_kwargs(kwargs))
+    def connection_stats(self):
+        # urllib3 counts requests and newly opened connections per host pool,
+        # everything above one request per connection was a keep-alive reuse
+        stats = {'requests': 0, 'connections': 0}
+        for adapter in set(self.session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    stats['requests'] += pool.num_requests
+                    stats['connections'] += pool.num_connections
+        stats['reused'] = max(stats['requests'] - stats['connections'], 0)
+        return stats
     
     def update_args(self, args):
         args = list(args)
@@ -49,21 +221,120 @@ class AnonymousUser(object):
         raise Exception('Non-existent config value: %s' % name)
 
 
+def bigquery_body(bibcodes, chunk):
+    # a generator body makes requests send it with chunked transfer encoding
+    yield b'bibcode\n'
+    lines = []
+    for bibcode in bibcodes:
+        if isinstance(bibcode, bytes):
+            bibcode = bibcode.decode('utf-8')
+        bibcode = bibcode.strip()
+        if bibcode:
+            lines.append(bibcode)
+        if len(lines) >= chunk:
+            yield (u'\n'.join(lines) + u'\n').encode('utf-8')
+            lines = []
+    if lines:
+        yield (u'\n'.join(lines) + u'\n').encode('utf-8')
+
+
+_leased_token = None
+_token_shared = False
+_lease_lock = threading.Lock()
+
+def leased_token():
+    # one token per process, shared by all authenticated users in it
+    global _leased_token, _token_shared
+    with _lease_lock:
+        if _leased_token is None:
+            tokens = config.AUTHENTICATED_USER_ACCESS_TOKENS
+            if not tokens:
+                _leased_token = config.AUTHENTICATED_USER_ACCESS_TOKEN
+                _token_shared = 'PYTEST_XDIST_WORKER' in os.environ
+            else:
+                _leased_token = lease(tokens, config.TOKEN_LEASES)
+                if _leased_token is None:
+                    worker = os.environ.get('PYTEST_XDIST_WORKER', 'gw0')
+                    _leased_token = tokens[int(worker.lstrip('gw') or 0) % len(tokens)]
+                    _token_shared = True
+                    logging.warning('All %d test tokens are leased, sharing one', len(tokens))
+        return _leased_token
+
+
+def token_shared():
+    # whether other test processes (xdist workers) use the token of this one
+    leased_token()
+    return _token_shared
+
+
 class AuthenticatedUser(AnonymousUser):
     def __init__(self):
         AnonymousUser.__init__(self)
-        self.access_token = config.AUTHENTICATED_USER_ACCESS_TOKEN
+        self._access_token = None
+    
+    @property
+    def access_token(self):
+        # leased on first use, the xdist controller never takes one
+        if self._access_token is None:
+            self._access_token = leased_token()
+        return self._access_token
+    
+    @access_token.setter
+    def access_token(self, value):
+        self._access_token = value
 
         
 class BumblebeeAnonymousUser(AnonymousUser):
     def __init__(self):
         AnonymousUser.__init__(self)
-        # dont want to fail tests 
+        self._access_token = None
+        self._token_lock = threading.Lock()
+        self.token_store = None
+        if config.CASSETTE_MODE:
+            self.token_store = cassette.CassetteTokenStore(cassette.load(config.CASSETTE),
+                                                           config.CASSETTE_MODE)
+        elif config.BOOTSTRAP_TOKEN_CACHE:
+            self.token_store = TokenStore(config.BOOTSTRAP_TOKEN_CACHE,
+                                          margin=config.BOOTSTRAP_TOKEN_MARGIN)
+    
+    @property
+    def access_token(self):
+        # bootstrapped on first use, never while the tests are being collected;
+        # concurrent first requests wait for a single bootstrap. A failed
+        # bootstrap is tried again by the next request
+        if self._access_token is None:
+            with self._token_lock:
+                if self._access_token is None:
+                    token = self.fetch_access_token()
+                    if not token:
+                        return token
+                    self._access_token = token
+        return self._access_token
+    
+    def fetch_access_token(self):
+        # dont want to fail tests, but a test that is out of time has to stop
         try:
-            r = self.get('/accounts/bootstrap')
-            self.access_token = r.json()['access_token']
-        except:
+            if self.token_store:
+                return self.token_store.get(self.api_url, self.bootstrap)
+            return self.bootstrap()[0]
+        except timeouts.DeadlineExceeded:
+            raise
+        except Exception:
             logging.error('Failed getting access_token for Bumblebee user!')
+            return ''
+    
+    def bootstrap(self):
+        # skips update_kwargs, there is no token to send yet
+        r = self.send('GET', self.update_args(['/accounts/bootstrap'])[0])
+        data = r.json()
+        return data['access_token'], self._expires(data.get('expire_in'))
+    
+    def _expires(self, expire_in):
+        try:
+            expires = datetime.datetime.strptime(expire_in[0:19], '%Y-%m-%dT%H:%M:%S')
+            return calendar.timegm(expires.timetuple())
+        except (TypeError, ValueError):
+            return time.time() + config.BOOTSTRAP_TOKEN_TTL
 
 
             